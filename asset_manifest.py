@@ -0,0 +1,164 @@
+import argparse
+import atexit
+import hashlib
+import json
+import os
+import sys
+
+from PIL import Image
+
+# Every asset directory gets a manifest of this name, so sizes and hashes survive between runs
+MANIFEST_NAME = '.asset_manifest.json'
+# POWERPYNT_ASSET_MANIFEST=0 keeps manifests in memory only (e.g. for read-only asset directories)
+MANIFEST_ENABLED = os.environ.get("POWERPYNT_ASSET_MANIFEST", "1") not in ("", "0")
+
+# Bump this whenever what an entry holds changes, so old manifests are rebuilt
+MANIFEST_VERSION = 1
+
+# Files build() picks up; anything else is still added on first use
+ASSET_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.bmp', '.tif', '.tiff', '.csv')
+
+# Resolution python-pptx assumes for images that do not state one
+DEFAULT_DPI = 72
+
+_manifests = {}  # absolute directory -> AssetManifest
+
+
+class AssetInfo:
+    # What placement and caching code needs to know about an asset file, without opening it again
+
+    __slots__ = ('sha256', 'size', 'dpi', 'format', 'mode')
+
+    def __init__(self, sha256, size=None, dpi=None, format=None, mode=None):
+        self.sha256 = sha256
+        self.size = tuple(size) if size else None  # (width, height) in pixels; None for files that aren't images
+        self.dpi = tuple(dpi) if dpi else (DEFAULT_DPI, DEFAULT_DPI)
+        self.format = format
+        self.mode = mode
+
+    @classmethod
+    def from_file(cls, path):
+        # Hashes the file in chunks, then reads the image header only; the pixels are never decoded
+        sha = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                sha.update(chunk)
+        try:
+            with Image.open(path) as image:
+                return cls(sha.hexdigest(), image.size, _dpi(image), image.format, image.mode)
+        except (OSError, ValueError):  # CSV files and other non-image assets only have a hash
+            return cls(sha.hexdigest())
+
+    def to_json(self):
+        return {'sha256': self.sha256, 'size': self.size, 'dpi': self.dpi, 'format': self.format, 'mode': self.mode}
+
+
+def _dpi(image):
+    # Same rule as python-pptx: a missing or nonsensical resolution counts as DEFAULT_DPI
+    dpi = image.info.get('dpi')
+    if not dpi:
+        return DEFAULT_DPI, DEFAULT_DPI
+    return tuple(int(round(value)) if value and 0 < value < 10000 else DEFAULT_DPI for value in dpi[:2])
+
+
+class AssetManifest:
+    # Hash, pixel size, DPI, format and mode of every asset in one directory, stored in MANIFEST_NAME there.
+    # An entry is recomputed only when the file's size or modification time changed.
+
+    def __init__(self, directory, persistent=MANIFEST_ENABLED):
+        self.directory = directory
+        self.path = os.path.join(directory, MANIFEST_NAME)
+        self.persistent = persistent
+        self.updated = 0
+        self._entries = {}  # file name -> (size, mtime_ns, AssetInfo)
+        self._dirty = set()
+        if persistent:
+            self._entries = self._read()
+
+    def _read(self):
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if manifest.get('v') != MANIFEST_VERSION:
+            return {}
+        return {name: (entry['bytes'], entry['mtime_ns'], AssetInfo(**entry['info']))
+                for name, entry in manifest['assets'].items()}
+
+    def info(self, name):
+        # Returns the AssetInfo of a file in this directory. Raises FileNotFoundError like open() does.
+        stat = os.stat(os.path.join(self.directory, name))
+        entry = self._entries.get(name)
+        if entry is None or entry[0] != stat.st_size or entry[1] != stat.st_mtime_ns:
+            info = AssetInfo.from_file(os.path.join(self.directory, name))
+            entry = self._entries[name] = (stat.st_size, stat.st_mtime_ns, info)
+            self._dirty.add(name)
+            self.updated += 1
+        return entry[2]
+
+    def build(self):
+        # Brings every asset of the directory up to date; returns how many entries had to be (re)computed
+        updated = self.updated
+        for name in sorted(os.listdir(self.directory)):
+            if name.lower().endswith(ASSET_EXTENSIONS) and os.path.isfile(os.path.join(self.directory, name)):
+                self.info(name)
+        return self.updated - updated
+
+    def save(self):
+        # Writes the entries computed since the last save, merged with what other processes may have written
+        # in the meantime. Does nothing for a manifest kept in memory only or with nothing new.
+        if not self.persistent or not self._dirty:
+            return
+        entries = self._read()
+        entries.update((name, self._entries[name]) for name in self._dirty)
+        manifest = {'v': MANIFEST_VERSION, 'assets': {
+            name: {'bytes': size, 'mtime_ns': mtime_ns, 'info': info.to_json()}
+            for name, (size, mtime_ns, info) in sorted(entries.items())}}
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(manifest, f, indent=1)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            return  # a read-only asset directory just means the manifest is rebuilt next time
+        self._dirty.clear()
+
+
+def manifest_for(directory):
+    # Returns the manifest of a directory, loading it on first use. Manifests are saved at exit.
+    directory = os.path.abspath(directory)
+    manifest = _manifests.get(directory)
+    if manifest is None:
+        if not _manifests:
+            atexit.register(save_manifests)
+        manifest = _manifests[directory] = AssetManifest(directory)
+    return manifest
+
+
+def asset_info(path):
+    # Returns the AssetInfo of any asset file
+    directory, name = os.path.split(os.path.abspath(path))
+    return manifest_for(directory).info(name)
+
+
+def save_manifests():
+    for manifest in _manifests.values():
+        manifest.save()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or update the asset manifests of directories.")
+    parser.add_argument('directories', nargs='*', default=['.'], help="asset directories")
+    args = parser.parse_args(argv)
+
+    for directory in args.directories:
+        manifest = manifest_for(directory)
+        updated = manifest.build()
+        manifest.save()
+        print(f"{manifest.path}: {len(manifest._entries)} assets, {updated} updated")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
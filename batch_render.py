@@ -0,0 +1,73 @@
+import argparse
+import glob
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+SPEC_PATTERNS = ('*.json', '*.yaml', '*.yml')
+
+
+def _init_worker():
+    # Runs once per worker process, so pptx, PIL and the image cache index are loaded before the first deck
+    # and stay warm (along with the in-memory image cache) for every deck the worker renders after it
+    import deck_renderer  # noqa: F401
+    import slide_helpers  # noqa: F401
+
+
+def render_spec_file(spec_path, out_dir):
+    # Renders one spec to <out_dir>/<spec name>.pptx and returns (spec path, output path, seconds)
+    from asset_manifest import save_manifests
+    from deck_renderer import load_spec, render_deck
+    from image_cache import memo_for
+
+    start = time.perf_counter()
+    spec = load_spec(spec_path)
+    prs = render_deck(spec, os.path.dirname(spec_path))
+    memo_for(prs).finish()
+    save_manifests()  # pool workers exit without running atexit handlers
+    output_path = os.path.join(out_dir, os.path.splitext(os.path.basename(spec_path))[0] + '.pptx')
+    prs.save(output_path)
+    return spec_path, output_path, time.perf_counter() - start
+
+
+def find_specs(spec_dir):
+    specs = []
+    for pattern in SPEC_PATTERNS:
+        specs.extend(glob.glob(os.path.join(spec_dir, pattern)))
+    return sorted(specs)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render every deck spec in a directory across worker processes.")
+    parser.add_argument('spec_dir', help="directory of .json/.yaml deck specs")
+    parser.add_argument('--out-dir', default='rendered', help="where the .pptx files are written")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="number of worker processes")
+    args = parser.parse_args(argv)
+
+    specs = find_specs(args.spec_dir)
+    if not specs:
+        print(f"No deck specs found in {args.spec_dir}")
+        return 1
+    os.makedirs(args.out_dir, exist_ok=True)
+
+    start = time.perf_counter()
+    failures = 0
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker) as executor:
+        futures = {executor.submit(render_spec_file, spec_path, args.out_dir): spec_path for spec_path in specs}
+        for future in as_completed(futures):
+            try:
+                spec_path, output_path, seconds = future.result()
+                print(f"{spec_path} -> {output_path} ({seconds:.2f}s)")
+            except Exception as e:
+                failures += 1
+                print(f"An error occurred while rendering {futures[future]}: {e}")
+    elapsed = time.perf_counter() - start
+
+    rendered = len(specs) - failures
+    print(f"Rendered {rendered} of {len(specs)} decks in {elapsed:.2f}s "
+          f"({rendered / elapsed * 3600:.0f} decks/hour with {args.workers} workers)")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,111 @@
+import argparse
+import sys
+import time
+import tracemalloc
+
+from lxml import etree
+
+from deck_renderer import DeckRenderer
+
+FONT_NAME = "Open Sans"
+COLORS = ['4285F4', 'DB4437', 'F4B400', '0F9D58']
+
+
+def catalog_slide(index):
+    # A text-only catalog page: a keyword-styled title, four labelled badges and a bulleted description
+    elements = [{
+        'type': 'textbox', 'box': [0.5, 0.4, 15, 1],
+        'paragraphs': [{'align': 'center', 'runs': [{
+            'styled_text': f"Google catalog item {index}",
+            'font': {'name': FONT_NAME, 'size': 36, 'bold': True, 'color': '202124'}}]}],
+    }]
+    for badge, color in enumerate(COLORS):
+        elements.append({
+            'type': 'shape', 'shape': 'oval', 'box': [1 + badge * 3.8, 1.8, 2, 2], 'fill': color, 'line': False,
+            'anchor': 'middle', 'word_wrap': True,
+            'paragraphs': [{'text': f"Option {badge + 1}", 'align': 'center',
+                            'font': {'name': FONT_NAME, 'size': 16, 'bold': True, 'color': 'FFFFFF'}}],
+        })
+    elements.append({
+        'type': 'textbox', 'box': [0.5, 4.3, 15, 4.2], 'word_wrap': True, 'clear': True,
+        'paragraphs': [{'bullets': [f"Feature {line} of item {index}, available in every region" for line in range(6)],
+                        'font': {'name': FONT_NAME, 'color': '202124'},
+                        'bullet_font': {'size': 28}, 'text_font': {'size': 20}}],
+    })
+    return {'elements': elements}
+
+
+class CallCounter:
+    # Counts Python and builtin function calls while active: every python-pptx proxy, lxml wrapper and
+    # setter shows up here, so it tracks the object overhead of a build path
+
+    def __init__(self):
+        self.calls = 0
+
+    def _profile(self, frame, event, arg):
+        if event in ('call', 'c_call'):
+            self.calls += 1
+
+    def __enter__(self):
+        sys.setprofile(self._profile)
+        return self
+
+    def __exit__(self, *exc_info):
+        sys.setprofile(None)
+
+
+def build(spec, compact):
+    renderer = DeckRenderer(spec, compact=compact)
+    prs = renderer.new_presentation()
+    for slide_spec in spec['slides']:
+        renderer.render_slide(prs, slide_spec)
+    return prs
+
+
+def measure(slide_count, compact, repeat):
+    spec = {'slides': [catalog_slide(index) for index in range(slide_count)]}
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        prs = build(spec, compact)
+        seconds.append(time.perf_counter() - start)
+    # Counting calls and tracing allocations slow the build down, so they get runs of their own
+    sample = {'slides': spec['slides'][:min(slide_count, 100)]}
+    with CallCounter() as counter:
+        build(sample, compact)
+    tracemalloc.start()
+    build(sample, compact)
+    allocated_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    per_sample = len(sample['slides'])
+    return prs, {'seconds_per_slide': min(seconds) / slide_count, 'calls_per_slide': counter.calls / per_sample,
+                 'peak_bytes_per_slide': allocated_peak / per_sample}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Compare building text slides through python-pptx objects and through slide_model records.")
+    parser.add_argument('--slides', type=int, default=1000, help="catalog slides per build")
+    parser.add_argument('--repeat', type=int, default=3, help="timed builds per path; the fastest is kept")
+    args = parser.parse_args(argv)
+
+    results = {}
+    decks = {}
+    for label, compact in (('python-pptx', False), ('slide_model', True)):
+        decks[label], results[label] = measure(args.slides, compact, args.repeat)
+        result = results[label]
+        print(f"{label:>12}: {result['seconds_per_slide'] * 1000:.3f} ms/slide, "
+              f"{result['calls_per_slide']:.0f} calls/slide, "
+              f"{result['peak_bytes_per_slide'] / 1024:.1f} KB peak traced memory/slide")
+    old, new = results['python-pptx'], results['slide_model']
+    print(f"slide_model is {old['seconds_per_slide'] / new['seconds_per_slide']:.2f}x faster with "
+          f"{1 - new['calls_per_slide'] / old['calls_per_slide']:.0%} fewer calls")
+
+    same = all(etree.tostring(a._element) == etree.tostring(b._element)
+               for a, b in zip(decks['python-pptx'].slides, decks['slide_model'].slides))
+    print("Slide XML is identical" if same else "Slide XML DIFFERS between the two paths")
+    return 0 if same else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
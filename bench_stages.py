@@ -0,0 +1,182 @@
+import argparse
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+import PIL
+import pptx
+from pptx.dml.color import RGBColor
+from pptx.util import Inches
+
+import slide_helpers
+from deck_renderer import DeckRenderer, load_spec
+from image_cache import ImageCache, memo_for
+from pptx_save import save_to_stream
+from slide_helpers import add_background_image_with_brightness, add_colored_google_text, add_cropped_picture
+
+# Image stages are split: the plain stage times images processed for the first time in a deck (Pillow, with
+# a cold cache), the _reuse stage later uses of the same image, which the presentation's image memo serves
+STAGES = ('background', 'background_reuse', 'cropped_picture', 'cropped_picture_reuse', 'colored_text', 'bullets',
+          'chart', 'prs_save', 'save_to_stream')
+
+ASSET_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKGROUNDS = ['title_slide.png', 'blue_bg.png', 'red_bg.png', 'yellow_bg.png', 'green_bg.png', 'conc_slide.png']
+CROPPED_PICTURES = ['slide4_price.png', 'slide9_person.png', 'slide3_fashion.png']
+WHITE_FONT = RGBColor(0xFF, 0xFF, 0xFF)
+FONT_NAME = "Open Sans"
+BULLET_LINES = [
+    "Google Glass was a solution in search of a problem.",
+    "The built-in camera raised serious privacy questions.",
+    "Many businesses, such as bars and movie theaters, banned the use of Google Glass on their premises.",
+    "The design screamed \"tech gadget\" rather than \"fashion accessory.\"",
+    "A new product needs to solve a real problem or offer a compelling new experience to succeed.",
+]
+CHART_EVERY = 10  # one chart slide per this many slides
+
+
+class StageTimer:
+    def __init__(self):
+        self.totals = dict.fromkeys(STAGES, 0.0)
+
+    def time(self, stage, fn, *args, **kwargs):
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        self.totals[stage] += time.perf_counter() - start
+        return result
+
+    def time_image(self, stage, prs, fn, *args, **kwargs):
+        # Like time(), counted under stage + '_reuse' when the picture reused an image already in prs
+        memo = memo_for(prs)
+        reuses = memo.reuses
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        self.totals[stage if memo.reuses == reuses else stage + '_reuse'] += time.perf_counter() - start
+        return result
+
+
+def build_synthetic_deck(slide_count, timer, renderer, chart_element):
+    # A deck of slide_count slides built from the bundled assets, timing each stage separately
+    prs = renderer.new_presentation()
+    layout = prs.slide_layouts[6]
+    bullets_element = {
+        'type': 'textbox', 'box': [8, 1.5, 7.5, 6], 'word_wrap': True, 'clear': True,
+        'paragraphs': [{'bullets': BULLET_LINES, 'font': {'name': FONT_NAME, 'color': 'FFFFFF'},
+                        'bullet_font': {'size': 28}, 'text_font': {'size': 24}}],
+    }
+    for index in range(slide_count):
+        slide = prs.slides.add_slide(layout)
+        timer.time_image('background', prs, add_background_image_with_brightness, slide,
+                         os.path.join(ASSET_DIR, BACKGROUNDS[index % len(BACKGROUNDS)]))
+        if index % CHART_EVERY == CHART_EVERY - 1:
+            timer.time('chart', renderer.add_element, prs, slide, chart_element)
+            continue
+        timer.time_image('cropped_picture', prs, add_cropped_picture, slide,
+                         os.path.join(ASSET_DIR, CROPPED_PICTURES[index % len(CROPPED_PICTURES)]),
+                         left=Inches(0), top=Inches(0), crop_right_percent=0.4, height=prs.slide_height)
+        title = slide.shapes.add_textbox(Inches(8), Inches(0.5), Inches(7.5), Inches(1)).text_frame.paragraphs[0]
+        timer.time('colored_text', add_colored_google_text, title, f"Google Glass, part {index + 1}",
+                   FONT_NAME, 36, True, WHITE_FONT, use_special_colors=index % 2 == 0)
+        timer.time('bullets', renderer.add_element, prs, slide, bullets_element)
+    return prs
+
+
+def run_size(slide_count, spec, chart_element):
+    timer = StageTimer()
+    renderer = DeckRenderer(spec, ASSET_DIR)
+    # A cold image cache and a new presentation (with its own image memo) for every run, so image stages
+    # measure Pillow and not earlier runs; the caller's cache is put back afterwards
+    previous_cache = slide_helpers.image_cache
+    with tempfile.TemporaryDirectory() as cache_dir:
+        slide_helpers.set_image_cache(ImageCache(cache_dir))
+        try:
+            prs = build_synthetic_deck(slide_count, timer, renderer, chart_element)
+            timer.time('prs_save', prs.save, io.BytesIO())
+            timer.time('save_to_stream', save_to_stream, prs, io.BytesIO())
+        finally:
+            slide_helpers.set_image_cache(previous_cache)
+    return timer.totals
+
+
+def run(sizes, repeat):
+    # The sample deck's spec supplies the colors and the chart
+    spec = load_spec(os.path.join(ASSET_DIR, 'google_glass_deck.json'))
+    chart_element = next(element for slide in spec['slides']
+                         for element in slide.get('elements', []) if element['type'] == 'chart')
+    results = {}
+    spreads = {}
+    for slide_count in sizes:
+        runs = [run_size(slide_count, spec, chart_element) for _ in range(repeat)]
+        # Best of the runs for each stage, the least noisy estimate of its cost, and how far the median run
+        # was above it, which a single outlier run does not move
+        results[str(slide_count)] = {stage: min(totals[stage] for totals in runs) for stage in STAGES}
+        spreads[str(slide_count)] = {stage: statistics.median(totals[stage] for totals in runs)
+                                     - results[str(slide_count)][stage] for stage in STAGES}
+        summary = ', '.join(f"{stage} {seconds:.3f}s" for stage, seconds in results[str(slide_count)].items())
+        print(f"{slide_count:>5} slides: {summary}")
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'python_pptx': pptx.__version__,
+            'pillow': PIL.__version__,
+            'machine': platform.machine(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'repeat': repeat,
+        },
+        'results': results,
+        'spreads': spreads,
+    }
+
+
+def compare(baseline, current, threshold, min_seconds):
+    # Returns the (size, stage, old, new) entries that got slower by more than threshold (a fraction) and by
+    # more than the two runs' own spread between repeats, which is how far apart identical code lands.
+    # Stages under min_seconds in both runs are too noisy to judge and are skipped.
+    regressions = []
+    for size, stages in current['results'].items():
+        old_stages = baseline['results'].get(size, {})
+        for stage, new in stages.items():
+            old = old_stages.get(stage)
+            if old is None or max(old, new) < min_seconds:
+                continue
+            noise = (baseline.get('spreads', {}).get(size, {}).get(stage, 0)
+                     + current.get('spreads', {}).get(size, {}).get(stage, 0))
+            if new - old > max(old * threshold, noise):
+                regressions.append((size, stage, old, new))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time each deck-building stage on synthetic decks.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000], help="slide counts to build")
+    parser.add_argument('--repeat', type=int, default=5, help="runs per size; the fastest is kept")
+    parser.add_argument('--output', default='bench_results.json', help="where to write the results")
+    parser.add_argument('--compare', metavar='BASELINE', help="results file to check for regressions against")
+    parser.add_argument('--threshold', type=float, default=0.10, help="allowed slowdown, as a fraction")
+    # Stages of a few milliseconds vary by more than the threshold between identical runs
+    parser.add_argument('--min-seconds', type=float, default=0.05, help="ignore stages faster than this")
+    args = parser.parse_args(argv)
+
+    results = run(args.sizes, args.repeat)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, results, args.threshold, args.min_seconds)
+        for size, stage, old, new in regressions:
+            print(f"REGRESSION {size} slides, {stage}: {old:.3f}s -> {new:.3f}s (+{(new / old - 1):.0%})")
+        if regressions:
+            return 1
+        print(f"No regressions beyond {args.threshold:.0%}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,275 @@
+import argparse
+import io
+import json
+import os
+import queue
+import socket
+import socketserver
+import struct
+import sys
+import threading
+import time
+
+# Where the daemon listens and the client connects
+SOCKET_PATH = os.environ.get("POWERPYNT_SOCKET", "/tmp/powerpynt-build.sock")
+# Jobs waiting to be built; once it is full new jobs are turned away with a "busy" reply
+QUEUE_SIZE = int(os.environ.get("POWERPYNT_QUEUE_SIZE", "16"))
+# How long a client waits for a queue slot before being told the daemon is busy
+QUEUE_TIMEOUT = float(os.environ.get("POWERPYNT_QUEUE_TIMEOUT", "5"))
+
+# Every message is a frame: header length and payload length (big-endian), a JSON header, then raw bytes
+_FRAME = struct.Struct('>II')
+
+# This module is also the client, so pptx and PIL are only imported when the daemon starts
+
+
+def send_message(sock, header, payload=b''):
+    header_bytes = json.dumps(header).encode('utf-8')
+    sock.sendall(_FRAME.pack(len(header_bytes), len(payload)) + header_bytes)
+    if payload:
+        sock.sendall(payload)
+
+
+def _recv_exactly(sock, size):
+    buffer = bytearray()
+    while len(buffer) < size:
+        chunk = sock.recv(min(size - len(buffer), 1024 * 1024))
+        if not chunk:
+            raise ConnectionError("connection closed mid-message")
+        buffer += chunk
+    return bytes(buffer)
+
+
+def recv_message(sock):
+    # Returns (header dict, payload bytes)
+    header_size, payload_size = _FRAME.unpack(_recv_exactly(sock, _FRAME.size))
+    header = json.loads(_recv_exactly(sock, header_size))
+    return header, _recv_exactly(sock, payload_size)
+
+
+class LatencyStats:
+    # Per-job timings (queue wait, render, save, total) for the daemon's lifetime
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals = []
+        self.jobs = 0
+        self.failures = 0
+        self.rejected = 0
+
+    def record(self, timings, ok=True):
+        with self._lock:
+            self.jobs += 1
+            if not ok:
+                self.failures += 1
+            self._totals.append(timings['total'])
+
+    def reject(self):
+        with self._lock:
+            self.rejected += 1
+
+    def summary(self):
+        with self._lock:
+            totals = sorted(self._totals)
+            summary = {'jobs': self.jobs, 'failures': self.failures, 'rejected': self.rejected}
+        if totals:
+            summary.update({
+                'p50_ms': totals[len(totals) // 2] * 1000,
+                'p95_ms': totals[min(len(totals) - 1, int(len(totals) * 0.95))] * 1000,
+                'max_ms': totals[-1] * 1000,
+            })
+        return summary
+
+
+class _Job:
+
+    def __init__(self, request):
+        self.request = request
+        self.queued = time.perf_counter()
+        self.done = threading.Event()
+        self.header = None
+        self.payload = b''
+
+
+class BuildDaemon:
+    # Keeps one warm interpreter: pptx, PIL and the renderer are imported once, the image cache (on disk and
+    # in memory) and the asset manifests persist between jobs, and a blank presentation is parsed from the
+    # default template while the daemon is idle, so a job starts rendering straight away.
+    # Jobs are built one at a time on the builder thread, in arrival order, since python-pptx objects and
+    # the image cache are not shared safely between threads.
+
+    def __init__(self, socket_path=SOCKET_PATH, queue_size=QUEUE_SIZE, queue_timeout=QUEUE_TIMEOUT):
+        import pptx
+
+        import deck_renderer
+        from asset_manifest import save_manifests
+        from image_cache import memo_for
+        from pptx_save import save_to_stream
+
+        self._pptx = pptx
+        self._deck_renderer = deck_renderer
+        self._memo_for = memo_for
+        self._save_manifests = save_manifests
+        self._save_to_stream = save_to_stream
+        self.socket_path = socket_path
+        self.queue_timeout = queue_timeout
+        self.jobs = queue.Queue(maxsize=queue_size)
+        self.stats = LatencyStats()
+        self._spare = pptx.Presentation()
+        self._server = None
+
+    def _blank_presentation(self):
+        prs, self._spare = self._spare, None
+        return prs if prs is not None else self._pptx.Presentation()
+
+    def build(self, request):
+        # Renders the requested deck and returns (pptx bytes, the spec's "output", timings in seconds).
+        # The request holds either a "spec_path" or an inline "spec" plus "base_dir" (image paths are
+        # resolved against it).
+        start = time.perf_counter()
+        if 'spec' in request:
+            spec, base_dir = request['spec'], request.get('base_dir', '')
+        else:
+            spec = self._deck_renderer.load_spec(request['spec_path'])
+            base_dir = request.get('base_dir', os.path.dirname(request['spec_path']))
+        prs = self._deck_renderer.DeckRenderer(spec, base_dir).render(self._blank_presentation())
+        self._memo_for(prs).finish()
+        self._save_manifests()  # new asset entries are on disk even if the daemon is killed later
+        rendered = time.perf_counter()
+        buffer = io.BytesIO()
+        self._save_to_stream(prs, buffer)
+        saved = time.perf_counter()
+        return buffer.getvalue(), spec.get('output'), {'render': rendered - start, 'save': saved - rendered}
+
+    def run_builder(self):
+        # Builder loop; returns once stop() has been called and the queue is drained
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+            started = time.perf_counter()
+            try:
+                job.payload, output, timings = self.build(job.request)
+                ok = True
+                job.header = {'ok': True, 'output': output}
+            except Exception as e:
+                ok = False
+                timings = {}
+                job.header = {'ok': False, 'error': f"{type(e).__name__}: {e}"}
+            timings['queue'] = started - job.queued
+            timings['total'] = time.perf_counter() - job.queued
+            self.stats.record(timings, ok)
+            job.header['timings'] = timings
+            job.done.set()
+            if self._spare is None:
+                self._spare = self._pptx.Presentation()
+
+    def submit(self, request):
+        # Called from connection threads. Blocks for at most queue_timeout; returns None when the queue is full.
+        job = _Job(request)
+        try:
+            self.jobs.put(job, timeout=self.queue_timeout)
+        except queue.Full:
+            self.stats.reject()
+            return None
+        job.done.wait()
+        return job
+
+    def serve_forever(self):
+        daemon = self
+
+        class Handler(socketserver.BaseRequestHandler):
+
+            def handle(self):
+                request, _ = recv_message(self.request)
+                command = request.get('command', 'build')
+                if command == 'stats':
+                    send_message(self.request, {'ok': True, 'stats': daemon.stats.summary()})
+                elif command == 'shutdown':
+                    send_message(self.request, {'ok': True})
+                    threading.Thread(target=daemon.stop).start()
+                elif command == 'build':
+                    job = daemon.submit(request)
+                    if job is None:
+                        send_message(self.request, {'ok': False, 'busy': True, 'error': "build queue is full"})
+                    else:
+                        send_message(self.request, job.header, job.payload)
+                else:
+                    send_message(self.request, {'ok': False, 'error': f"unknown command {command!r}"})
+
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        self._server = socketserver.ThreadingUnixStreamServer(self.socket_path, Handler)
+        self._server.daemon_threads = True
+        builder = threading.Thread(target=self.run_builder, daemon=True)
+        builder.start()
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+            os.remove(self.socket_path)
+            self.jobs.put(None)
+            builder.join()
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+
+
+def request(message, socket_path=SOCKET_PATH):
+    # Thin client: sends one message to the daemon and returns (header, payload)
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+        send_message(sock, message)
+        return recv_message(sock)
+
+
+def build(spec_path, output_path=None, socket_path=SOCKET_PATH):
+    # Has the daemon build spec_path and writes the result to output_path (by default the spec's "output").
+    # Returns the reply header, with the path written to as "output".
+    header, payload = request({'command': 'build', 'spec_path': os.path.abspath(spec_path)}, socket_path)
+    if header['ok']:
+        output_path = output_path or header['output'] or 'Google_Glass_Failure_Presentation.pptx'
+        header['output'] = output_path
+        with open(output_path, 'wb') as f:
+            f.write(payload)
+    return header
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build decks in a warm long-running process.")
+    parser.add_argument('--socket', default=SOCKET_PATH, help="Unix socket the daemon listens on")
+    commands = parser.add_subparsers(dest='command', required=True)
+    serve = commands.add_parser('serve', help="run the daemon")
+    serve.add_argument('--queue-size', type=int, default=QUEUE_SIZE,
+                       help="jobs that may wait before clients are turned away")
+    build_parser = commands.add_parser('build', help="build a deck through the daemon")
+    build_parser.add_argument('spec', help="deck spec to build")
+    build_parser.add_argument('output', nargs='?', help="where the .pptx goes (default: the spec's \"output\")")
+    commands.add_parser('stats', help="print the daemon's latency stats")
+    commands.add_parser('shutdown', help="stop the daemon")
+    args = parser.parse_args(argv)
+
+    if args.command == 'serve':
+        print(f"Build daemon listening on {args.socket}")
+        BuildDaemon(args.socket, args.queue_size).serve_forever()
+        return 0
+    if args.command == 'build':
+        start = time.perf_counter()
+        header = build(args.spec, args.output, args.socket)
+        if not header['ok']:
+            print(f"An error occurred while building {args.spec}: {header['error']}")
+            return 2 if header.get('busy') else 1
+        timings = header['timings']
+        print(f"{args.spec} -> {header['output']} in {(time.perf_counter() - start) * 1000:.0f} ms "
+              f"(queue {timings['queue'] * 1000:.0f} ms, render {timings['render'] * 1000:.0f} ms, "
+              f"save {timings['save'] * 1000:.0f} ms)")
+        return 0
+    header, _ = request({'command': args.command}, args.socket)
+    if args.command == 'stats':
+        print(json.dumps(header['stats'], indent=1))
+    return 0 if header['ok'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,186 @@
+import argparse
+import hashlib
+import io
+import json
+import struct
+import zipfile
+
+PATCH_MAGIC = b'PPTXPATCH1\n'
+_LOCAL_HEADER = struct.Struct('<4s5H3L2H')  # local file header, up to the name and extra fields
+
+
+def _sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def _entries(package_bytes):
+    # Splits a zip into its raw records. Returns (entries, start of the central directory), where each entry is
+    # a dict with the member name, the record span (local header, data and any data descriptor) and the
+    # span of the compressed data alone.
+    with zipfile.ZipFile(io.BytesIO(package_bytes)) as zf:
+        infos = sorted(zf.infolist(), key=lambda info: info.header_offset)
+        central_directory = zf.start_dir
+    entries = []
+    for index, info in enumerate(infos):
+        start = info.header_offset
+        end = infos[index + 1].header_offset if index + 1 < len(infos) else central_directory
+        fields = _LOCAL_HEADER.unpack_from(package_bytes, start)
+        data_start = start + _LOCAL_HEADER.size + fields[-2] + fields[-1]
+        entries.append({
+            'name': info.filename,
+            'start': start,
+            'end': end,
+            'data_start': data_start,
+            'data_end': data_start + info.compress_size,
+        })
+    return entries, central_directory
+
+
+class _PatchBuilder:
+    # Collects copy-from-old and literal operations, merging neighbours of the same kind
+
+    def __init__(self):
+        self.ops = []  # ['copy', old offset, length] or ['data', literal offset, length]
+        self.literal = bytearray()
+
+    def copy(self, offset, length):
+        if length <= 0:
+            return
+        last = self.ops[-1] if self.ops else None
+        if last and last[0] == 'copy' and last[1] + last[2] == offset:
+            last[2] += length
+        else:
+            self.ops.append(['copy', offset, length])
+
+    def data(self, data):
+        if not data:
+            return
+        last = self.ops[-1] if self.ops else None
+        if last and last[0] == 'data':
+            last[2] += len(data)
+        else:
+            self.ops.append(['data', len(self.literal), len(data)])
+        self.literal += data
+
+
+def compare_parts(old_bytes, new_bytes):
+    # Part-level comparison by content hash. Returns {member name: status}, where status is 'unchanged',
+    # 'changed', 'added', or 'same as <old member>' for content that moved to another part name.
+    with zipfile.ZipFile(io.BytesIO(old_bytes)) as old_zip, zipfile.ZipFile(io.BytesIO(new_bytes)) as new_zip:
+        old_hashes = {name: _sha256(old_zip.read(name)) for name in old_zip.namelist()}
+        by_hash = {}
+        for name, digest in old_hashes.items():
+            by_hash.setdefault(digest, name)
+        report = {}
+        for name in new_zip.namelist():
+            digest = _sha256(new_zip.read(name))
+            if old_hashes.get(name) == digest:
+                report[name] = 'unchanged'
+            elif digest in by_hash:
+                report[name] = f'same as {by_hash[digest]}'
+            else:
+                report[name] = 'changed' if name in old_hashes else 'added'
+    return report
+
+
+def make_patch(old_bytes, new_bytes):
+    # Returns patch bytes that turn old_bytes into exactly new_bytes. Zip records and compressed data found
+    # anywhere in the old package are referenced by offset (matched by hash, not by part name); everything
+    # else is carried in the patch.
+    old_entries, _ = _entries(old_bytes)
+    old_records = {}
+    old_data = {}
+    for entry in old_entries:
+        old_records.setdefault(_sha256(old_bytes[entry['start']:entry['end']]), entry)
+        old_data.setdefault(_sha256(old_bytes[entry['data_start']:entry['data_end']]), entry)
+
+    new_entries, central_directory = _entries(new_bytes)
+    builder = _PatchBuilder()
+    builder.data(new_bytes[:new_entries[0]['start'] if new_entries else central_directory])
+    for entry in new_entries:
+        record = new_bytes[entry['start']:entry['end']]
+        match = old_records.get(_sha256(record))
+        if match is not None:
+            builder.copy(match['start'], match['end'] - match['start'])
+            continue
+        builder.data(new_bytes[entry['start']:entry['data_start']])
+        match = old_data.get(_sha256(new_bytes[entry['data_start']:entry['data_end']]))
+        if match is not None and entry['data_end'] > entry['data_start']:
+            builder.copy(match['data_start'], match['data_end'] - match['data_start'])
+        else:
+            builder.data(new_bytes[entry['data_start']:entry['data_end']])
+        builder.data(new_bytes[entry['data_end']:entry['end']])
+    builder.data(new_bytes[central_directory:])
+
+    header = json.dumps({
+        'old_sha256': _sha256(old_bytes),
+        'new_sha256': _sha256(new_bytes),
+        'new_size': len(new_bytes),
+        'ops': builder.ops,
+        'parts': compare_parts(old_bytes, new_bytes),
+    }, separators=(',', ':')).encode('utf-8')
+    return PATCH_MAGIC + struct.pack('<L', len(header)) + header + bytes(builder.literal)
+
+
+def read_patch(patch_bytes):
+    # Returns (header dict, literal bytes)
+    if not patch_bytes.startswith(PATCH_MAGIC):
+        raise ValueError("Not a deck patch")
+    offset = len(PATCH_MAGIC)
+    (header_size,) = struct.unpack_from('<L', patch_bytes, offset)
+    offset += 4
+    header = json.loads(patch_bytes[offset:offset + header_size])
+    return header, patch_bytes[offset + header_size:]
+
+
+def apply_patch(old_bytes, patch_bytes):
+    # Rebuilds the new package from the old one; raises ValueError if either does not match the patch
+    header, literal = read_patch(patch_bytes)
+    if _sha256(old_bytes) != header['old_sha256']:
+        raise ValueError("The patch was made against a different package")
+    out = bytearray()
+    for kind, offset, length in header['ops']:
+        source = old_bytes if kind == 'copy' else literal
+        out += source[offset:offset + length]
+    if _sha256(out) != header['new_sha256']:
+        raise ValueError("Patched package does not match the expected result")
+    return bytes(out)
+
+
+def _read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ship only the changed parts of a regenerated deck.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    diff_parser = commands.add_parser('diff', help="write a patch turning OLD into NEW")
+    diff_parser.add_argument('old')
+    diff_parser.add_argument('new')
+    diff_parser.add_argument('patch')
+    apply_parser = commands.add_parser('apply', help="apply PATCH to OLD and write the result to OUT")
+    apply_parser.add_argument('old')
+    apply_parser.add_argument('patch')
+    apply_parser.add_argument('out')
+    args = parser.parse_args(argv)
+
+    if args.command == 'diff':
+        old_bytes, new_bytes = _read(args.old), _read(args.new)
+        patch_bytes = make_patch(old_bytes, new_bytes)
+        with open(args.patch, 'wb') as f:
+            f.write(patch_bytes)
+        header, _ = read_patch(patch_bytes)
+        for name, status in header['parts'].items():
+            if status != 'unchanged':
+                print(f"{status:>10}  {name}")
+        print(f"Patch is {len(patch_bytes)} bytes for a {len(new_bytes)} byte package "
+              f"({len(patch_bytes) / len(new_bytes):.1%})")
+    else:
+        with open(args.out, 'wb') as f:
+            f.write(apply_patch(_read(args.old), _read(args.patch)))
+        print(f"Wrote {args.out}")
+
+
+if __name__ == '__main__':
+    main()
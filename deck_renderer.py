@@ -0,0 +1,314 @@
+import json
+import os
+
+import pptx
+from pptx.chart.data import CategoryChartData
+from pptx.dml.color import RGBColor
+from pptx.enum.chart import XL_CHART_TYPE
+from pptx.enum.shapes import MSO_SHAPE
+from pptx.enum.text import MSO_ANCHOR, PP_ALIGN
+from pptx.util import Inches, Pt
+
+from profiling import profile_slide, profiled
+from run_styler import RunStyler
+from series_chart import add_series_chart, read_csv_columns
+from slide_model import ShapeRecord, write_shape
+from slide_helpers import add_background_image_with_brightness, add_cropped_picture, add_picture, google_styler
+
+BLANK_LAYOUT = 6
+
+ALIGNMENTS = {
+    'left': PP_ALIGN.LEFT,
+    'center': PP_ALIGN.CENTER,
+    'right': PP_ALIGN.RIGHT,
+    'justify': PP_ALIGN.JUSTIFY,
+}
+
+ANCHORS = {
+    'top': MSO_ANCHOR.TOP,
+    'middle': MSO_ANCHOR.MIDDLE,
+    'bottom': MSO_ANCHOR.BOTTOM,
+}
+
+CHART_TYPES = {
+    'column_clustered': XL_CHART_TYPE.COLUMN_CLUSTERED,
+    'bar_clustered': XL_CHART_TYPE.BAR_CLUSTERED,
+    'line': XL_CHART_TYPE.LINE,
+    'pie': XL_CHART_TYPE.PIE,
+}
+
+# Series of these charts are drawn as lines, so a series "color" sets the line rather than the fill
+LINE_CHART_TYPES = {XL_CHART_TYPE.LINE}
+
+# Main_File --compact-slides: build text boxes and shapes as slide_model records and write each one's XML in
+# a single pass, instead of through python-pptx's shape, paragraph, run and font objects
+COMPACT_SLIDES = os.environ.get("POWERPYNT_COMPACT_SLIDES", "") not in ("", "0")
+
+
+def set_compact_slides(enabled):
+    # Default for renderers created after this call
+    global COMPACT_SLIDES
+    COMPACT_SLIDES = enabled
+
+
+def load_spec(spec_path):
+    # Reads a deck spec. JSON always works; .yaml/.yml specs need PyYAML installed.
+    with open(spec_path, encoding='utf-8') as f:
+        if spec_path.endswith(('.yaml', '.yml')):
+            import yaml
+            return yaml.safe_load(f)
+        return json.load(f)
+
+
+class DeckRenderer:
+    # Turns a deck spec (see google_glass_deck.json) into a Presentation.
+    # Lengths are in inches; "full" stands for the slide width or height. Colors are hex strings or names
+    # from the spec's "colors" table. Image and CSV paths are relative to the spec's "asset_dir", which is itself
+    # relative to base_dir (normally the directory the spec was loaded from). "styled_text" runs highlight the
+    # spec's "keywords" (see RunStyler), or just "Google" when the spec has none. With compact (by default
+    # COMPACT_SLIDES) text boxes and shapes are built as slide_model records; the slide XML comes out the same.
+
+    def __init__(self, spec, base_dir='', compact=None):
+        self.spec = spec
+        self.compact = COMPACT_SLIDES if compact is None else compact
+        self.base_dir = os.path.join(base_dir, spec.get('asset_dir', ''))
+        self.colors = {name: RGBColor.from_string(value) for name, value in spec.get('colors', {}).items()}
+        self.styler = RunStyler(spec['keywords']) if 'keywords' in spec else google_styler
+        self._element_renderers = {
+            'textbox': self._add_textbox,
+            'shape': self._add_shape,
+            'picture': self._add_picture,
+            'cropped_picture': self._add_cropped_picture,
+            'chart': self._add_chart,
+            'series_chart': self._add_series_chart,
+        }
+
+    def new_presentation(self, prs=None):
+        # prs may be an empty Presentation prepared in advance (see build_daemon)
+        if prs is None:
+            prs = pptx.Presentation()
+        prs.slide_width = Inches(self.spec.get('slide_width', 16))
+        prs.slide_height = Inches(self.spec.get('slide_height', 9))
+        return prs
+
+    def render(self, prs=None):
+        prs = self.new_presentation(prs)
+        for index, slide_spec in enumerate(self.spec['slides'], start=1):
+            with profile_slide(index) as frame:
+                slide = self.render_slide(prs, slide_spec)
+                if frame is not None:
+                    frame.element = slide._element
+        return prs
+
+    def render_slide(self, prs, slide_spec):
+        slide = prs.slides.add_slide(prs.slide_layouts[self.spec.get('layout', BLANK_LAYOUT)])
+        background = slide_spec.get('background')
+        if background:
+            add_background_image_with_brightness(slide, self._image(background['image']),
+                                                 background.get('brightness', 0.9))
+        for element in slide_spec.get('elements', []):
+            self.add_element(prs, slide, element)
+        return slide
+
+    def add_element(self, prs, slide, element):
+        # Adds one spec element (textbox, shape, picture, cropped_picture, chart or series_chart) to slide
+        return self._element_renderers[element['type']](prs, slide, element)
+
+    # Values
+
+    def _color(self, value):
+        return self.colors[value] if value in self.colors else RGBColor.from_string(value)
+
+    def _image(self, image_path):
+        return os.path.join(self.base_dir, image_path)
+
+    def _length(self, value, full):
+        if value is None:
+            return None
+        return full if value == 'full' else Inches(value)
+
+    def _box(self, prs, box):
+        left, top, width, height = box
+        return (self._length(left, prs.slide_width), self._length(top, prs.slide_height),
+                self._length(width, prs.slide_width), self._length(height, prs.slide_height))
+
+    def _apply_font(self, font, font_spec):
+        if 'name' in font_spec:
+            font.name = font_spec['name']
+        if 'size' in font_spec:
+            font.size = Pt(font_spec['size'])
+        if 'bold' in font_spec:
+            font.bold = font_spec['bold']
+        if 'color' in font_spec:
+            font.color.rgb = self._color(font_spec['color'])
+
+    # Text
+
+    def _paragraph_specs(self, items):
+        # "bullets" items are shorthand for one paragraph per line: a bullet run, then the line itself
+        for item in items:
+            if 'bullets' not in item:
+                yield item
+                continue
+            for line in item['bullets']:
+                runs = [{'text': item.get('bullet', '∙ '), 'font': item.get('bullet_font', {})}]
+                if item.get('styled'):
+                    runs.append({'styled_text': line, 'font': item['text_font'], 'special_colors': False})
+                else:
+                    runs.append({'text': line, 'font': item.get('text_font', {})})
+                yield {'font': item.get('font', {}), 'runs': runs}
+
+    def _fill_paragraph(self, paragraph, paragraph_spec):
+        if 'align' in paragraph_spec:
+            paragraph.alignment = ALIGNMENTS[paragraph_spec['align']]
+        if 'text' in paragraph_spec:
+            paragraph.text = paragraph_spec['text']
+        if paragraph_spec.get('font'):
+            self._apply_font(paragraph.font, paragraph_spec['font'])
+        for run_spec in paragraph_spec.get('runs', []):
+            if 'styled_text' in run_spec:
+                font_spec = run_spec['font']
+                self.styler.add_text(paragraph, run_spec['styled_text'], font_spec['name'], font_spec['size'],
+                                     font_spec.get('bold', False), self._color(font_spec['color']),
+                                     use_special_colors=run_spec.get('special_colors', True))
+            else:
+                run = paragraph.add_run()
+                run.text = run_spec['text']
+                self._apply_font(run.font, run_spec.get('font', {}))
+
+    def _fill_text_frame(self, text_frame, element):
+        if 'word_wrap' in element:
+            text_frame.word_wrap = element['word_wrap']
+        if 'anchor' in element:
+            text_frame.vertical_anchor = ANCHORS[element['anchor']]
+        # Without "clear" the first paragraph fills the frame's existing paragraph; with it, that one is
+        # emptied and every paragraph is appended after it
+        if element.get('clear'):
+            text_frame.clear()
+            paragraphs = []
+        else:
+            paragraphs = [text_frame.paragraphs[0]]
+        for index, paragraph_spec in enumerate(self._paragraph_specs(element.get('paragraphs', []))):
+            paragraph = paragraphs[index] if index < len(paragraphs) else text_frame.add_paragraph()
+            self._fill_paragraph(paragraph, paragraph_spec)
+
+    # Elements
+
+    def _add_textbox(self, prs, slide, element):
+        if self.compact:
+            record = ShapeRecord(*self._box(prs, element['box']))
+            self._fill_text_frame(record.text_frame, element)
+            return write_shape(slide, record)
+        textbox = slide.shapes.add_textbox(*self._box(prs, element['box']))
+        self._fill_text_frame(textbox.text_frame, element)
+        return textbox
+
+    def _add_shape(self, prs, slide, element):
+        if self.compact:
+            record = ShapeRecord(*self._box(prs, element['box']), autoshape_type=MSO_SHAPE[element['shape'].upper()])
+            if 'fill' in element:
+                record.fill = self._color(element['fill'])
+            if element.get('line') is False:
+                record.line = False
+            self._fill_text_frame(record.text_frame, element)
+            return write_shape(slide, record)
+        shape = slide.shapes.add_shape(MSO_SHAPE[element['shape'].upper()], *self._box(prs, element['box']))
+        if 'fill' in element:
+            shape.fill.solid()
+            shape.fill.fore_color.rgb = self._color(element['fill'])
+        if element.get('line') is False:
+            shape.line.fill.background()
+        self._fill_text_frame(shape.text_frame, element)
+        return shape
+
+    def _add_picture(self, prs, slide, element):
+        picture = add_picture(slide, self._image(element['image']),
+                              self._length(element.get('left', 0), prs.slide_width),
+                              self._length(element.get('top', 0), prs.slide_height),
+                              self._length(element.get('width'), prs.slide_width),
+                              self._length(element.get('height'), prs.slide_height))
+        if element.get('center'):
+            picture.left = int((prs.slide_width - picture.width) / 2)
+        return picture
+
+    def _add_cropped_picture(self, prs, slide, element):
+        size = {}
+        if element.get('width') is not None:
+            size['width'] = self._length(element['width'], prs.slide_width)
+        if element.get('height') is not None:
+            size['height'] = self._length(element['height'], prs.slide_height)
+        add_cropped_picture(slide, self._image(element['image']),
+                            self._length(element.get('left', 0), prs.slide_width),
+                            self._length(element.get('top', 0), prs.slide_height),
+                            crop_right_percent=element.get('crop_right', 0.4), **size)
+
+    @profiled('add_chart', slide_arg=2, chart=True)
+    def _add_chart(self, prs, slide, element):
+        chart_data = CategoryChartData()
+        chart_data.categories = element['categories']
+        for series_spec in element['series']:
+            chart_data.add_series(series_spec['name'], series_spec['values'])
+
+        graphic_frame = slide.shapes.add_chart(
+            CHART_TYPES[element.get('chart_type', 'column_clustered')], *self._box(prs, element['box']), chart_data
+        )
+        self._style_chart(graphic_frame.chart, element)
+        return graphic_frame
+
+    def _add_series_chart(self, prs, slide, element):
+        # Long series read from a CSV file: "x" names the category column and each "series" entry a value
+        # column. Points are downsampled for display ("downsample": "lttb", "minmax" or null to draw all,
+        # "max_points" to override the display-based count); the workbook keeps them all.
+        columns = [element['x']] + [series_spec['column'] for series_spec in element['series']]
+        data = read_csv_columns(self._image(element['csv']), columns)
+        series = [(series_spec.get('name', series_spec['column']), data[series_spec['column']])
+                  for series_spec in element['series']]
+        graphic_frame = add_series_chart(slide, data[element['x']], series, *self._box(prs, element['box']),
+                                         chart_type=CHART_TYPES[element.get('chart_type', 'line')],
+                                         max_points=element.get('max_points'),
+                                         method=element.get('downsample', 'lttb'))
+        self._style_chart(graphic_frame.chart, element)
+        return graphic_frame
+
+    def _style_chart(self, chart, element):
+        chart.has_legend = element.get('legend', False)
+
+        title = element.get('title')
+        if title:
+            chart.chart_title.text_frame.text = title['text']
+            self._apply_font(chart.chart_title.text_frame.paragraphs[0].font, title.get('font', {}))
+
+        for axis, axis_spec in ((chart.category_axis, element.get('category_axis')),
+                                (chart.value_axis, element.get('value_axis'))):
+            if not axis_spec:
+                continue
+            color = self._color(axis_spec['color'])
+            if 'title' in axis_spec:
+                axis.has_title = True
+                axis.axis_title.text_frame.text = axis_spec['title']
+                axis.axis_title.text_frame.paragraphs[0].font.color.rgb = color
+            if axis_spec.get('gridlines'):
+                axis.has_major_gridlines = True
+                axis.major_gridlines.format.line.fill.solid()
+                axis.major_gridlines.format.line.fill.fore_color.rgb = color
+            axis.tick_labels.font.color.rgb = color
+            axis.format.line.fill.solid()
+            axis.format.line.fill.fore_color.rgb = color
+
+        plot = chart.plots[0]
+        data_labels = element.get('data_labels')
+        if data_labels:
+            plot.has_data_labels = True
+            self._apply_font(plot.data_labels.font, data_labels)
+        for series, series_spec in zip(plot.series, element['series']):
+            if 'color' in series_spec:
+                if chart.chart_type in LINE_CHART_TYPES:
+                    series.format.line.color.rgb = self._color(series_spec['color'])
+                else:
+                    series.format.fill.solid()
+                    series.format.fill.fore_color.rgb = self._color(series_spec['color'])
+
+
+def render_deck(spec, base_dir=''):
+    # Builds the Presentation described by spec
+    return DeckRenderer(spec, base_dir).render()
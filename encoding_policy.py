@@ -0,0 +1,160 @@
+import argparse
+import io
+import json
+import os
+import tempfile
+import time
+
+from PIL import Image
+
+# Quality of re-encoded photographic images
+JPEG_QUALITY = int(os.environ.get("POWERPYNT_JPEG_QUALITY", "85"))
+# A JPEG needing no crop or brightness change is embedded byte-for-byte unless it is more than this many
+# times larger than its display size in either direction; re-encoding it would cost quality for little gain
+JPEG_PASSTHROUGH_SLACK = float(os.environ.get("POWERPYNT_JPEG_PASSTHROUGH_SLACK", "1.25"))
+# Images with at least this many distinct colors (counted on a thumbnail) are treated as photographs
+PHOTO_MIN_COLORS = 4096
+
+_THUMBNAIL_SIZE = (256, 256)
+
+# Everything that changes the encoded bytes; part of the image cache key
+SETTINGS = {
+    'jpeg_quality': JPEG_QUALITY,
+    'passthrough_slack': JPEG_PASSTHROUGH_SLACK,
+    'photo_colors': PHOTO_MIN_COLORS,
+}
+
+# Per-asset records while a report is being collected (see start_report)
+_report = None
+
+
+def passthrough_ok(source, size, transformed):
+    # Whether the source file can be embedded as-is instead of resampling it down to size
+    if transformed or source.format != 'JPEG' or size is None:
+        return False
+    return source.width <= size[0] * JPEG_PASSTHROUGH_SLACK and source.height <= size[1] * JPEG_PASSTHROUGH_SLACK
+
+
+def _uses_alpha(image):
+    if image.mode in ('RGBA', 'LA', 'PA'):
+        return image.getchannel('A').getextrema()[0] < 255
+    return 'transparency' in image.info
+
+
+def is_photographic(image):
+    thumbnail = image.copy()
+    thumbnail.thumbnail(_THUMBNAIL_SIZE, Image.NEAREST)  # nearest keeps flat areas flat
+    return thumbnail.getcolors(PHOTO_MIN_COLORS) is None
+
+
+def choose_format(image, source_format):
+    # Returns (format, reason). Transparency needs PNG; JPEG sources stay JPEG, as they are lossy already;
+    # otherwise photographs become JPEG and flat graphics (diagrams, charts, logos) stay lossless PNG.
+    if _uses_alpha(image):
+        return 'PNG', 'transparency'
+    if source_format == 'JPEG':
+        return 'JPEG', 'jpeg source'
+    if is_photographic(image):
+        return 'JPEG', 'photographic'
+    return 'PNG', 'flat graphic'
+
+
+def _save(image, image_format):
+    stream = io.BytesIO()
+    if image_format == 'JPEG':
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        image.save(stream, format='JPEG', quality=JPEG_QUALITY)
+    else:
+        image.save(stream, format='PNG')
+    return stream.getvalue()
+
+
+def encode(image, source_format, name=None):
+    # Encodes a processed image in the format choose_format picks and returns the bytes
+    start = time.perf_counter()
+    image_format, reason = choose_format(image, source_format)
+    data = _save(image, image_format)
+    if _report is not None:
+        seconds = time.perf_counter() - start
+        png_start = time.perf_counter()
+        png_bytes = len(data) if image_format == 'PNG' else len(_save(image, 'PNG'))
+        _report.append({
+            'asset': name, 'source_format': source_format, 'size': list(image.size),
+            'format': image_format, 'reason': reason, 'bytes': len(data), 'seconds': seconds,
+            'png_bytes': png_bytes,
+            'png_seconds': seconds if image_format == 'PNG' else time.perf_counter() - png_start,
+        })
+    return data
+
+
+def record_passthrough(name, source_format, size, data):
+    if _report is not None:
+        _report.append({
+            'asset': name, 'source_format': source_format, 'size': list(size), 'format': source_format,
+            'reason': 'passthrough', 'bytes': len(data), 'seconds': 0.0, 'png_bytes': None, 'png_seconds': None,
+        })
+
+
+def start_report():
+    # Records every encode from now on, along with what forcing PNG would have cost (which encodes it twice)
+    global _report
+    _report = []
+
+
+def stop_report():
+    global _report
+    report, _report = _report, None
+    return report
+
+
+def report_table(report):
+    lines = [f"{'asset':32} {'format':>6} {'reason':>14} {'bytes':>10} {'vs png':>10} {'ms':>7} {'png ms':>7}"]
+    total = png_total = seconds = png_seconds = 0
+    for record in report:
+        png_bytes = record['png_bytes'] if record['png_bytes'] is not None else record['bytes']
+        png_time = record['png_seconds'] if record['png_seconds'] is not None else record['seconds']
+        total += record['bytes']
+        png_total += png_bytes
+        seconds += record['seconds']
+        png_seconds += png_time
+        lines.append(f"{os.path.basename(record['asset'] or '?')[:32]:32} {record['format']:>6} "
+                     f"{record['reason']:>14} {record['bytes']:>10} {record['bytes'] - png_bytes:>+10} "
+                     f"{record['seconds'] * 1000:>7.1f} {png_time * 1000:>7.1f}")
+    lines.append(f"{'total':32} {'':>6} {'':>14} {total:>10} {total - png_total:>+10} "
+                 f"{seconds * 1000:>7.1f} {png_seconds * 1000:>7.1f}")
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    # The pipeline records into the importable module, not into __main__ when this file is run as a script
+    import encoding_policy
+    from deck_renderer import load_spec, render_deck
+    from image_cache import ImageCache, memo_for
+    from slide_helpers import image_cache, set_image_cache
+
+    parser = argparse.ArgumentParser(
+        description="Build a deck with an empty image cache and report, per image, the format chosen and "
+                    "its size and encode time against always using PNG.")
+    parser.add_argument('spec', nargs='?', default='google_glass_deck.json', help="deck spec to build")
+    parser.add_argument('--json', help="also write the per-asset records here")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        set_image_cache(ImageCache(cache_dir))
+        encoding_policy.start_report()
+        try:
+            prs = render_deck(load_spec(args.spec), os.path.dirname(args.spec))
+            memo_for(prs).finish()
+        finally:
+            report = encoding_policy.stop_report()
+            set_image_cache(image_cache)
+    print(report_table(report))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=1)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,256 @@
+import hashlib
+import io
+import json
+import os
+import time
+import weakref
+from collections import OrderedDict
+
+from pptx.opc.constants import RELATIONSHIP_TYPE as RT
+
+from asset_manifest import asset_info
+from encoding_policy import SETTINGS as ENCODING_SETTINGS
+from media_spill import MediaSpill
+
+# Bump this whenever the way images are processed changes, so old cache entries are not reused
+CACHE_VERSION = 2
+
+DEFAULT_CACHE_DIR = os.environ.get("POWERPYNT_CACHE_DIR", ".image_cache")
+DEFAULT_MAX_BYTES = int(os.environ.get("POWERPYNT_CACHE_MAX_MB", "512")) * 1024 * 1024
+# Recently used entries are also kept in memory, so a long-lived process (e.g. a batch worker) stays warm
+DEFAULT_MEMORY_BYTES = int(os.environ.get("POWERPYNT_CACHE_MEMORY_MB", "64")) * 1024 * 1024
+
+
+def file_digest(image_path):
+    # Returns the SHA-256 of a file's contents, from the asset manifest of its directory (so it is only
+    # computed again when the file changes). Raises FileNotFoundError like Image.open does.
+    return asset_info(image_path).sha256
+
+
+class ImageCache:
+    # On-disk cache of processed image bytes, keyed by the source file hash plus the transform parameters.
+    # The total size is bounded; the least recently used entries are evicted first.
+    # Several processes may share one cache directory: writes are atomic and entries written by another
+    # process are picked up on lookup.
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES, memory_bytes=DEFAULT_MEMORY_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.memory_bytes = memory_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # key -> size in bytes, oldest first
+        self._total_bytes = 0
+        self._memory = OrderedDict()  # key -> bytes, oldest first
+        self._memory_total = 0
+        self._load_index()
+
+    def _load_index(self):
+        # The file modification time doubles as the "last used" time, so LRU order survives between runs
+        if not os.path.isdir(self.cache_dir):
+            return
+        found = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.bin'):
+                continue
+            stat = os.stat(os.path.join(self.cache_dir, name))
+            found.append((stat.st_mtime_ns, name[:-4], stat.st_size))
+        for _, key, size in sorted(found):
+            self._entries[key] = size
+            self._total_bytes += size
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + '.bin')
+
+    def make_key(self, image_path, **params):
+        payload = json.dumps({'v': CACHE_VERSION, 'src': file_digest(image_path), 'params': params,
+                              'encoding': ENCODING_SETTINGS},
+                             sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        data = self._memory.get(key)
+        if data is not None:
+            # A memory hit is a use too: keep the disk LRU order and the file's "last used" time in step
+            self._memory.move_to_end(key)
+            if key in self._entries:
+                self._entries.move_to_end(key)
+            try:
+                os.utime(self._path(key))
+            except FileNotFoundError:
+                pass
+            self.hits += 1
+            return data
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            # Never written, or evicted by another process
+            self._forget(key)
+            self.misses += 1
+            return None
+        os.utime(path)
+        if key not in self._entries:
+            self._total_bytes += len(data)
+        self._entries[key] = len(data)
+        self._entries.move_to_end(key)
+        self._remember(key, data)
+        self.hits += 1
+        return data
+
+    def put(self, key, data):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)  # atomic, so a concurrent reader never sees a half-written entry
+        self._forget(key)
+        self._entries[key] = len(data)
+        self._total_bytes += len(data)
+        self._remember(key, data)
+        self._evict()
+
+    def get_or_create(self, image_path, create, **params):
+        # Returns the cached bytes for (image_path, params), calling create() to produce them on a miss
+        key = self.make_key(image_path, **params)
+        data = self.get(key)
+        if data is None:
+            data = create()
+            self.put(key, data)
+        return data
+
+    def _remember(self, key, data):
+        if len(data) > self.memory_bytes:
+            return
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_total -= len(old)
+        self._memory[key] = data
+        self._memory_total += len(data)
+        while self._memory_total > self.memory_bytes:
+            _, dropped = self._memory.popitem(last=False)
+            self._memory_total -= len(dropped)
+
+    def _forget(self, key):
+        size = self._entries.pop(key, None)
+        if size is not None:
+            self._total_bytes -= size
+        data = self._memory.pop(key, None)
+        if data is not None:
+            self._memory_total -= len(data)
+
+    def _evict(self):
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            key, _ = next(iter(self._entries.items()))
+            self._forget(key)
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+            self.evictions += 1
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'entries': len(self._entries),
+            'bytes': self._total_bytes,
+        }
+
+
+class PresentationImageMemo:
+    # In-process memo for one Presentation: each distinct (image, transform) pair is processed and embedded
+    # once, and later uses relate the slide to the same image part instead of re-encoding and re-hashing it.
+
+    def __init__(self):
+        self._parts = {}  # memo key -> (image part, seconds it took to produce and embed, size in bytes)
+        self._pending = []  # (slide, pic element, memo key, produce) for pictures added with defer=True
+        self.spill = None  # MediaSpill holding the images added with spill=True
+        self.over_budget = {}  # image path -> why it was embedded as the original file (see slide_helpers)
+        self.reuses = 0
+        self.seconds_saved = 0.0
+        self.bytes_saved = 0
+
+    def add_picture(self, slide, memo_key, produce, left, top, width=None, height=None, defer=False, spill=False):
+        # produce() returns the processed image bytes; it is only called the first time memo_key is seen.
+        # With defer=True the picture is inserted straight away and produce() is only called in finish(),
+        # so slides can keep being built while the bytes are produced elsewhere (see image_prefetch).
+        # Deferred pictures need both width and height, as the image is not known yet.
+        # With spill=True the bytes are written to a temporary file instead of being kept in the package.
+        shapes = slide.shapes
+        if defer and memo_key not in self._parts:
+            id_ = shapes._next_shape_id
+            pic = shapes._grpSp.add_pic(id_, "Picture %d" % (id_ - 1), "image", "", left, top, width, height)
+            self._pending.append((slide, pic, memo_key, produce))
+        else:
+            image_part, rId = self._relate(slide, memo_key, produce, spill)
+            if width is not None and height is not None:
+                # python-pptx's _add_pic_from_image_part parses the image for its native size even when
+                # both sides are given; the helpers always know them (from the asset manifest)
+                id_ = shapes._next_shape_id
+                pic = shapes._grpSp.add_pic(id_, "Picture %d" % (id_ - 1), image_part.desc, rId,
+                                            left, top, width, height)
+            else:
+                pic = shapes._add_pic_from_image_part(image_part, rId, left, top, width, height)
+        shapes._recalculate_extents()
+        return shapes._shape_factory(pic)
+
+    def _relate(self, slide, memo_key, produce, spill=False):
+        entry = self._parts.get(memo_key)
+        if entry is None:
+            start = time.perf_counter()
+            data = produce()
+            if spill:
+                if self.spill is None:
+                    self.spill = MediaSpill()
+                image_part, rId = self.spill.add_image(slide, data)
+            else:
+                image_part, rId = slide.part.get_or_add_image_part(io.BytesIO(data))
+            self._parts[memo_key] = (image_part, time.perf_counter() - start, len(data))
+        else:
+            image_part, cost, size = entry
+            rId = slide.part.relate_to(image_part, RT.IMAGE)
+            self.reuses += 1
+            self.seconds_saved += cost
+            self.bytes_saved += size
+        return image_part, rId
+
+    def finish(self):
+        # Points every deferred picture at its image part, taking the produced bytes in insertion order.
+        # Must be called before the presentation is saved.
+        for slide, pic, memo_key, produce in self._pending:
+            image_part, rId = self._relate(slide, memo_key, produce)
+            pic.blipFill.blip.rEmbed = rId
+            pic.nvPicPr.cNvPr.set('descr', image_part.desc)
+        self._pending = []
+
+    def sources(self):
+        # {image part: path of the image file it was made from}
+        return {entry[0]: memo_key[0] for memo_key, entry in self._parts.items()}
+
+    def stats(self):
+        return {
+            'distinct': len(self._parts),
+            'reuses': self.reuses,
+            'seconds_saved': self.seconds_saved,
+            'bytes_saved': self.bytes_saved,
+            'spilled_files': self.spill.files if self.spill is not None else 0,
+            'spilled_bytes': self.spill.bytes if self.spill is not None else 0,
+            'over_budget': len(self.over_budget),
+        }
+
+
+_presentation_memos = weakref.WeakKeyDictionary()
+
+
+def memo_for(prs):
+    # Returns the image memo belonging to prs, creating it on first use. It goes away with the presentation.
+    # Presentation proxies are not hashable, so the memo hangs off the presentation part they wrap.
+    memo = _presentation_memos.get(prs.part)
+    if memo is None:
+        memo = _presentation_memos[prs.part] = PresentationImageMemo()
+    return memo
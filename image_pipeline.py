@@ -0,0 +1,113 @@
+import math
+import os
+
+from PIL import Image, ImageEnhance, UnidentifiedImageError
+
+from asset_manifest import DEFAULT_DPI, asset_info
+from encoding_policy import encode, passthrough_ok, record_passthrough
+
+EMU_PER_INCH = 914400
+
+# Resolution pictures are resampled to before embedding: 150 is plenty for screens, use 220 for print
+DISPLAY_DPI = int(os.environ.get("POWERPYNT_DPI", "150"))
+
+# Streaming mode (Main_File --streaming) processes one image at a time with reduced JPEG decoding, spills
+# encoded media to a temporary directory, and refuses images whose decoding would not fit the memory budget
+STREAMING_ENABLED = os.environ.get("POWERPYNT_STREAMING", "") not in ("", "0")
+MEMORY_BUDGET = int(os.environ.get("POWERPYNT_MEMORY_BUDGET_MB", "512")) * 1024 * 1024
+
+# Leave brightness and cropping to PowerPoint and embed original files (Main_File --native-transforms)
+NATIVE_TRANSFORMS = os.environ.get("POWERPYNT_NATIVE_TRANSFORMS", "") not in ("", "0")
+
+# Decoded copies of one image alive at once while it is processed: the source plus one transformed copy,
+# and the encoder's buffers
+WORKING_COPIES = 3
+
+
+class MemoryBudgetExceeded(MemoryError):
+    pass
+
+
+def image_size(image_path):
+    # Returns (width, height) in pixels, from the asset manifest, so the file is only opened when it changed
+    size = asset_info(image_path).size
+    if size is None:
+        raise UnidentifiedImageError(f"cannot identify image file {image_path!r}")
+    return size
+
+
+def cropped_width(width, crop_right):
+    # Same rounding Pillow applies to a fractional crop box
+    return int(round(width * (1 - crop_right)))
+
+
+def fit_box(pixel_size, width=None, height=None, dpi=(DEFAULT_DPI, DEFAULT_DPI)):
+    # Returns the (width, height) in EMU the picture will occupy on the slide. A missing side is filled in
+    # from the image's aspect ratio, and with neither the image is shown at its own resolution, the same
+    # way python-pptx does it.
+    px_width, px_height = pixel_size
+    if width is None and height is None:
+        return int(px_width * EMU_PER_INCH / dpi[0]), int(px_height * EMU_PER_INCH / dpi[1])
+    if width is None:
+        width = int(round(height * px_width / px_height))
+    elif height is None:
+        height = int(round(width * px_height / px_width))
+    return int(width), int(height)
+
+
+def target_pixels(width, height, dpi=DISPLAY_DPI):
+    # Pixel size needed to show a width x height (EMU) box at the given DPI
+    return max(1, round(width * dpi / EMU_PER_INCH)), max(1, round(height * dpi / EMU_PER_INCH))
+
+
+def decoded_bytes(image):
+    return image.width * image.height * len(image.getbands())
+
+
+def process_image(image_path, size=None, brightness=None, crop_right=None, reduced=False, memory_budget=None):
+    # Crops, downsamples to at most `size` pixels, and adjusts brightness, in that order, then returns the
+    # encoded bytes in the format encoding_policy picks. Images are never upsampled, and an image no step
+    # changes (or a JPEG only slightly over size, see encoding_policy.passthrough_ok) is returned as the
+    # original file. With reduced=True a JPEG is decoded at 1/2, 1/4 or 1/8 scale when that still covers `size`. With a
+    # memory_budget (bytes), MemoryBudgetExceeded is raised before decoding an image that would not fit.
+    with Image.open(image_path) as source:
+        original_size = source.size
+        if passthrough_ok(source, size, bool(crop_right) or brightness is not None):
+            return _read_original(image_path, source)
+        if reduced and size is not None and source.format == 'JPEG':
+            source.draft(source.mode, (math.ceil(size[0] / (1 - (crop_right or 0))), size[1]))
+        if memory_budget is not None and decoded_bytes(source) * WORKING_COPIES > memory_budget:
+            raise MemoryBudgetExceeded(
+                f"{image_path}: decoding {source.width}x{source.height} needs about "
+                f"{decoded_bytes(source) * WORKING_COPIES // (1024 * 1024)} MB, "
+                f"over the {memory_budget // (1024 * 1024)} MB budget")
+        image = source
+        if crop_right:
+            image = _step(image, source, image.crop((0, 0, cropped_width(image.width, crop_right), image.height)))
+        if size is not None:
+            new_size = (min(image.width, size[0]), min(image.height, size[1]))
+            if new_size != image.size:
+                image = _step(image, source, image.resize(new_size, Image.LANCZOS))
+        if brightness is not None:
+            image = _step(image, source, ImageEnhance.Brightness(image).enhance(brightness))
+        if image is source and source.size == original_size:
+            return _read_original(image_path, source)
+        try:
+            return encode(image, source.format, image_path)
+        finally:
+            if image is not source:
+                image.close()
+
+
+def _read_original(image_path, source):
+    with open(image_path, 'rb') as f:
+        data = f.read()
+    record_passthrough(image_path, source.format, source.size, data)
+    return data
+
+
+def _step(image, source, result):
+    # Frees an intermediate image as soon as the next one exists, so at most two decoded copies are alive
+    if image is not source:
+        image.close()
+    return result
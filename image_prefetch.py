@@ -0,0 +1,57 @@
+import os
+from concurrent.futures import Future, ProcessPoolExecutor
+
+from image_pipeline import process_image
+
+# Number of worker processes for image preprocessing; 0 or 1 keeps everything on the main thread
+PREFETCH_WORKERS = int(os.environ.get("POWERPYNT_WORKERS", "0"))
+
+
+class ImagePrefetcher:
+    # Runs image operations (crop, resample, brightness, encode) in a process pool while the slides are
+    # being built. Results are written to the on-disk image cache as they are taken.
+
+    def __init__(self, image_cache, workers=PREFETCH_WORKERS, mp_context=None):
+        self.image_cache = image_cache
+        self._executor = ProcessPoolExecutor(max_workers=workers or None, mp_context=mp_context)
+        self._futures = {}  # cache key -> Future with the encoded bytes
+        self._stored = set()  # keys of pending futures whose bytes came from the cache
+        self.submitted = 0
+
+    def submit(self, image_path, size=None, brightness=None, crop_right=None):
+        # Starts the operation in a worker (unless it is cached or already running) and returns a callable
+        # that blocks until its bytes are ready
+        key = self.image_cache.make_key(image_path, brightness=brightness, crop=crop_right, size=size)
+        if key not in self._futures:
+            data = self.image_cache.get(key)
+            if data is None:
+                future = self._executor.submit(process_image, image_path, size, brightness, crop_right)
+                self.submitted += 1
+            else:
+                future = Future()
+                future.set_result(data)
+                self._stored.add(key)
+            self._futures[key] = future
+        return lambda: self._take(key)
+
+    def _take(self, key):
+        # The future is dropped once its bytes are taken, so finished images are not all held until shutdown
+        future = self._futures.pop(key, None)
+        if future is None:
+            # Taken before, when the bytes went into the image cache
+            return self.image_cache.get(key)
+        data = future.result()
+        if key not in self._stored:
+            # The cache is only touched from this process, so workers never race on it
+            self.image_cache.put(key, data)
+        self._stored.discard(key)
+        return data
+
+    def shutdown(self):
+        self._executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
@@ -0,0 +1,201 @@
+import copy
+import hashlib
+import io
+import json
+import os
+import re
+
+import pptx
+from pptx.opc.constants import RELATIONSHIP_TYPE as RT
+from pptx.opc.package import PartFactory, XmlPart
+from pptx.parts.image import ImagePart
+
+from deck_renderer import BLANK_LAYOUT, DeckRenderer
+from encoding_policy import SETTINGS
+from image_cache import CACHE_VERSION, file_digest
+from image_pipeline import DISPLAY_DPI
+from profiling import profile_slide
+import slide_helpers
+
+# POWERPYNT_INCREMENTAL=1 turns on Main_File's --incremental without passing the flag
+INCREMENTAL_ENABLED = os.environ.get("POWERPYNT_INCREMENTAL", "") not in ("", "0")
+
+# Bump this whenever the renderer's output for an unchanged spec changes, so old slides are not reused
+FINGERPRINT_VERSION = 1
+
+# Deck-level spec keys that affect how every slide is rendered
+DECK_KEYS = ('slide_width', 'slide_height', 'layout', 'colors', 'keywords', 'asset_dir')
+
+# Spec keys naming asset files, whose contents are part of the fingerprint
+ASSET_KEYS = ('image', 'csv')
+
+_R_NAMESPACE = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+_TRAILING_NUMBER = re.compile(r'\d+(\.\w+)$')
+
+
+def state_path(output_path):
+    # The fingerprints of a deck live next to it, e.g. deck.pptx.build.json
+    return output_path + '.build.json'
+
+
+def _asset_paths(value):
+    # Yields every asset entry ("image", "csv") in a slide spec, at any depth
+    if isinstance(value, dict):
+        for key, item in value.items():
+            if key in ASSET_KEYS and isinstance(item, str):
+                yield item
+            else:
+                yield from _asset_paths(item)
+    elif isinstance(value, list):
+        for item in value:
+            yield from _asset_paths(item)
+
+
+def slide_fingerprint(renderer, slide_spec):
+    # Hashes everything a slide's output depends on: its own spec (text, transform parameters, chart data),
+    # the contents of the images it uses, the deck-level settings and the image processing and encoding
+    # settings
+    payload = {
+        'v': FINGERPRINT_VERSION,
+        'cache': CACHE_VERSION,
+        'dpi': DISPLAY_DPI,
+        'encoding': SETTINGS,
+        'native': slide_helpers.native_transforms,
+        'streaming': slide_helpers.memory_budget is not None,
+        'deck': {key: renderer.spec.get(key) for key in DECK_KEYS},
+        'slide': slide_spec,
+        'assets': {path: file_digest(renderer._image(path)) for path in _asset_paths(slide_spec)},
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def _package_digest(path):
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def load_state(output_path):
+    # Returns the slide fingerprints recorded for output_path, or None when there is nothing to reuse:
+    # no previous build, or the .pptx was changed since (e.g. edited by hand)
+    try:
+        with open(state_path(output_path), encoding='utf-8') as f:
+            state = json.load(f)
+        if state.get('v') != FINGERPRINT_VERSION or state.get('package') != _package_digest(output_path):
+            return None
+    except (OSError, ValueError):
+        return None
+    return state['slides']
+
+
+def save_state(output_path, fingerprints):
+    # Call after output_path has been written
+    state = {'v': FINGERPRINT_VERSION, 'package': _package_digest(output_path), 'slides': fingerprints}
+    tmp_path = state_path(output_path) + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=1)
+    os.replace(tmp_path, state_path(output_path))
+
+
+class SlideCopier:
+    # Copies slides from a previous build into a new Presentation: the slide XML is deep-copied and every
+    # part it relates to (images, charts and their workbooks) is carried over as-is, without re-rendering.
+    # Parts shared by several copied slides are copied once; images go through the package's own
+    # de-duplication, so they are shared with freshly rendered slides too.
+
+    def __init__(self, old_prs, prs):
+        self.old_prs = old_prs
+        self.prs = prs
+        self.package = prs.part.package
+        self._copied = {}  # old part -> new part
+
+    def copy_slide(self, old_slide, layout):
+        slide = self._add_slide(layout)
+        element = slide._element
+        for child in list(element):
+            element.remove(child)
+        for child in old_slide._element:
+            element.append(copy.deepcopy(child))
+        self._copy_rels(old_slide.part, slide.part, skip=(RT.SLIDE_LAYOUT, RT.NOTES_SLIDE))
+        return slide
+
+    def _copy_rels(self, old_part, part, skip=()):
+        rid_map = {}
+        for rId, rel in old_part.rels.items():
+            if rel.reltype in skip:
+                continue
+            if rel.is_external:
+                rid_map[rId] = part.relate_to(rel.target_ref, rel.reltype, is_external=True)
+            else:
+                rid_map[rId] = part.relate_to(self._copy_part(rel.target_part), rel.reltype)
+        if any(old != new for old, new in rid_map.items()):
+            _remap_rids(part._element, rid_map)
+
+    def _copy_part(self, old_part):
+        part = self._copied.get(old_part)
+        if part is not None:
+            return part
+        if isinstance(old_part, ImagePart):
+            part = self._image_part(old_part)
+            self._copied[old_part] = part
+            return part
+        partname = self._next_partname(_TRAILING_NUMBER.sub(r'%d\1', old_part.partname))
+        part = PartFactory(partname, old_part.content_type, self.package, old_part.blob)
+        self._copied[old_part] = part
+        if isinstance(part, XmlPart):
+            self._copy_rels(old_part, part)
+        else:
+            for rel in old_part.rels.values():
+                part.relate_to(rel.target_ref if rel.is_external else self._copy_part(rel.target_part),
+                               rel.reltype, is_external=rel.is_external)
+        return part
+
+    def _add_slide(self, layout):
+        return self.prs.slides.add_slide(layout)
+
+    def _image_part(self, old_part):
+        return self.package.get_or_add_image_part(io.BytesIO(old_part.blob))
+
+    def _next_partname(self, template):
+        return self.package.next_partname(template)
+
+
+def _remap_rids(element, rid_map):
+    for node in element.iter():
+        for name, value in node.attrib.items():
+            if name.startswith(_R_NAMESPACE) and value in rid_map:
+                node.set(name, rid_map[value])
+
+
+def render_incremental(spec, base_dir, output_path):
+    # Builds the deck like render_deck, but slides whose fingerprint matches one recorded for the previous
+    # build of output_path are copied from that file instead of being rendered. Slides are matched by
+    # fingerprint, so moved slides are reused too. Returns (prs, fingerprints, number of reused slides);
+    # pass the fingerprints to save_state once the deck is saved.
+    renderer = DeckRenderer(spec, base_dir)
+    fingerprints = [slide_fingerprint(renderer, slide_spec) for slide_spec in spec['slides']]
+    previous = load_state(output_path)
+    old_slides = {}
+    copier = None
+    prs = renderer.new_presentation()
+    if previous is not None and set(previous) & set(fingerprints):
+        old_prs = pptx.Presentation(output_path)
+        for old_slide, fingerprint in zip(old_prs.slides, previous):
+            old_slides.setdefault(fingerprint, old_slide)
+        copier = SlideCopier(old_prs, prs)
+
+    layout = prs.slide_layouts[spec.get('layout', BLANK_LAYOUT)]
+    reused = 0
+    for index, (slide_spec, fingerprint) in enumerate(zip(spec['slides'], fingerprints), start=1):
+        with profile_slide(index) as frame:
+            old_slide = old_slides.get(fingerprint)
+            if old_slide is not None:
+                slide = copier.copy_slide(old_slide, layout)
+                reused += 1
+            else:
+                slide = renderer.render_slide(prs, slide_spec)
+            if frame is not None:
+                frame.element = slide._element
+    return prs, fingerprints, reused
@@ -0,0 +1,313 @@
+import argparse
+import glob
+import io
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from PIL import Image
+from pptx.opc.constants import CONTENT_TYPE as CT
+from pptx.opc.package import XmlPart, _Relationship
+from pptx.oxml.ns import qn
+from pptx.parts.image import ImagePart
+
+from encoding_policy import JPEG_PASSTHROUGH_SLACK, encode
+from image_pipeline import DISPLAY_DPI, target_pixels
+from pptx_save import save
+
+# Images whose perceptual hashes differ in at most this many of their 64 bits are treated as the same image
+DEDUPE_DISTANCE = int(os.environ.get("POWERPYNT_DEDUPE_DISTANCE", "4"))
+# ... as long as their aspect ratios are this close too, so different crops of one photo are kept apart
+ASPECT_TOLERANCE = 0.01
+# ... and their small color thumbnails differ by at most this much per channel on average (0-255). The hash
+# is taken in greyscale, so this is what keeps recolored and brightened variants of one image apart.
+COLOR_TOLERANCE = float(os.environ.get("POWERPYNT_DEDUPE_COLOR_TOLERANCE", "4"))
+
+_HASH_SIZE = 8
+_FORMAT_CONTENT_TYPES = {'JPEG': ('jpeg', CT.JPEG), 'PNG': ('png', CT.PNG)}
+
+_A_BLIP = qn('a:blip')
+_A_BLIPFILL = qn('a:blipFill')
+_A_SRCRECT = qn('a:srcRect')
+_P_GRPSP = qn('p:grpSp')
+_R_EMBED = qn('r:embed')
+_EXT_PATH = f"{qn('p:spPr')}/{qn('a:xfrm')}/{qn('a:ext')}"
+_GROUP_XFRM_PATH = f"{qn('p:grpSpPr')}/{qn('a:xfrm')}"
+
+
+class _Media:
+    # One image part of the package being optimized
+
+    __slots__ = ('part', 'size', 'format', 'has_alpha', 'hash', 'colors', 'display', 'displays', 'unsized')
+
+    def __init__(self, part):
+        self.part = part
+        self.display = (0, 0)  # largest on-slide size of the whole image, in EMU
+        self.displays = []  # on-slide size of each use, in EMU
+        self.unsized = False  # also used somewhere its display size could not be read from
+        try:
+            with Image.open(io.BytesIO(part.blob)) as image:
+                self.size = image.size
+                self.format = image.format
+                self.has_alpha = image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+                if image.format == 'JPEG':
+                    image.draft('RGB', (_HASH_SIZE * 8, _HASH_SIZE * 8))  # reduced decode; only thumbnails are taken
+                self.colors = color_thumbnail(image)
+                self.hash = perceptual_hash(image)
+        except (OSError, ValueError):  # EMF, WMF, SVG and the like are left as they are
+            self.size = self.format = self.has_alpha = self.hash = self.colors = None
+
+    def same_image(self, other):
+        if self.part.sha1 == other.part.sha1:
+            return True
+        if self.hash is None or other.hash is None or self.has_alpha != other.has_alpha:
+            return False
+        aspect, other_aspect = self.size[0] / self.size[1], other.size[0] / other.size[1]
+        if abs(aspect - other_aspect) > ASPECT_TOLERANCE * aspect:
+            return False
+        if bin(self.hash ^ other.hash).count('1') > DEDUPE_DISTANCE:
+            return False
+        difference = sum(abs(a - b) for a, b in zip(self.colors, other.colors))
+        return difference <= COLOR_TOLERANCE * len(self.colors)
+
+
+def perceptual_hash(image):
+    # 64-bit difference hash: whether each pixel of a 9x8 greyscale thumbnail is brighter than its right
+    # neighbour. Resizing and recompressing leave it (nearly) unchanged, but so do changes of color and
+    # brightness, which color_thumbnail catches.
+    pixels = image.convert('L').resize((_HASH_SIZE + 1, _HASH_SIZE), Image.BILINEAR).tobytes()
+    bits = 0
+    for row in range(_HASH_SIZE):
+        for column in range(_HASH_SIZE):
+            left = pixels[row * (_HASH_SIZE + 1) + column]
+            bits = bits << 1 | (left > pixels[row * (_HASH_SIZE + 1) + column + 1])
+    return bits
+
+
+def color_thumbnail(image):
+    # The RGB bytes of an 8x8 thumbnail, composited on white so transparent areas compare alike
+    if image.mode in ('RGBA', 'LA', 'PA', 'P') or 'transparency' in image.info:
+        rgba = image.convert('RGBA')
+        image = Image.new('RGBA', rgba.size, 'white')
+        image.alpha_composite(rgba)
+    return image.convert('RGB').resize((_HASH_SIZE, _HASH_SIZE), Image.BILINEAR).tobytes()
+
+
+def _display_size(blip, slide_size):
+    # Size in EMU the whole image behind an <a:blip> is drawn at: the extent of the picture or shape it fills
+    # (scaled by any groups around it), widened by the part cut off through <a:srcRect>. Backgrounds and
+    # anything else without an extent of its own cover the slide.
+    width, height = slide_size
+    element = blip.getparent()
+    while element is not None:
+        ext = element.find(_EXT_PATH)
+        if ext is not None:
+            width, height = int(ext.get('cx')), int(ext.get('cy'))
+            for group in element.iterancestors(_P_GRPSP):
+                xfrm = group.find(_GROUP_XFRM_PATH)
+                if xfrm is not None and xfrm.find(qn('a:chExt')) is not None:
+                    ext, child_ext = xfrm.find(qn('a:ext')), xfrm.find(qn('a:chExt'))
+                    width = width * int(ext.get('cx')) // max(1, int(child_ext.get('cx')))
+                    height = height * int(ext.get('cy')) // max(1, int(child_ext.get('cy')))
+            break
+        element = element.getparent()
+    blip_fill = blip.getparent()
+    src_rect = blip_fill.find(_A_SRCRECT) if blip_fill.tag == _A_BLIPFILL else None
+    if src_rect is not None:
+        shown_x = 1 - (int(src_rect.get('l', 0)) + int(src_rect.get('r', 0))) / 100000
+        shown_y = 1 - (int(src_rect.get('t', 0)) + int(src_rect.get('b', 0))) / 100000
+        width, height = int(width / max(shown_x, 0.01)), int(height / max(shown_y, 0.01))
+    return width, height
+
+
+def _image_relationships(package):
+    # Yields (source part, relationship) for every relationship pointing at an image part
+    for part in package.iter_parts():
+        for rel in part.rels.values():
+            if not rel.is_external and isinstance(rel.target_part, ImagePart):
+                yield part, rel
+
+
+def collect_images(prs, media_type=_Media):
+    # Returns ({image part: media_type(part)}, [(source part, relationship)]), with the display size of each
+    # use of an image (media_type.displays) and the largest width and height among them (media_type.display)
+    slide_size = (prs.slide_width, prs.slide_height)
+    package = prs.part.package
+    relationships = list(_image_relationships(package))
+    media = {}
+    for _, rel in relationships:
+        if rel.target_part not in media:
+            media[rel.target_part] = media_type(rel.target_part)
+    measured = set()
+    for part in package.iter_parts():
+        if not isinstance(part, XmlPart):
+            continue
+        for blip in part._element.iter(_A_BLIP):
+            rId = blip.get(_R_EMBED)
+            target = part.rels[rId].target_part if rId in part.rels else None
+            if target not in media:
+                continue
+            width, height = _display_size(blip, slide_size)
+            item = media[target]
+            item.display = (max(item.display[0], width), max(item.display[1], height))
+            item.displays.append((width, height))
+            measured.add((part, rId))
+    for source, rel in relationships:
+        if (source, rel.rId) not in measured:
+            media[rel.target_part].unsized = True
+    return media, relationships
+
+
+def _group(media):
+    # Near-duplicate groups, largest image first; the largest is the one kept
+    groups = []
+    for item in sorted(media.values(), key=lambda item: -(item.size[0] * item.size[1] if item.size else 0)):
+        for group in groups:
+            if group[0].same_image(item):
+                group.append(item)
+                break
+        else:
+            groups.append([item])
+    return groups
+
+
+def _scale(item, displays):
+    # The one factor (at most 1) the image can be scaled by and still cover every display at DISPLAY_DPI in
+    # both directions. Uses at different aspect ratios (stretched or cropped) each need their own larger side,
+    # so the image is never resampled to a box matching none of them.
+    if displays is None:
+        return 1.0
+    width, height = item.size
+    needed = 0.0
+    for display in displays:
+        pixels = target_pixels(*display, DISPLAY_DPI)
+        needed = max(needed, pixels[0] / width, pixels[1] / height)
+    return min(1.0, needed)
+
+
+def _optimized_blob(item, displays):
+    # Returns (bytes, format) of the kept image, downscaled to what its largest display needs at DISPLAY_DPI
+    # with its aspect ratio kept, or None when re-encoding would not make it smaller
+    if item.size is None or item.format not in ('JPEG', 'PNG', 'BMP', 'TIFF'):  # GIFs may be animated
+        return None
+    scale = _scale(item, displays)
+    target = (max(1, round(item.size[0] * scale)), max(1, round(item.size[1] * scale)))
+    oversized = scale * JPEG_PASSTHROUGH_SLACK < 1
+    if not oversized and item.format == 'JPEG':
+        return None  # re-encoding a JPEG at the same size only loses quality
+    with Image.open(io.BytesIO(item.part.blob)) as image:
+        if oversized:
+            if image.format == 'JPEG':
+                image.draft(image.mode, target)
+            image = image.resize(target, Image.LANCZOS)
+        data = encode(image, item.format, item.part.partname)
+        image_format = 'JPEG' if data.startswith(b'\xff\xd8') else 'PNG'
+    if len(data) >= len(item.part.blob):
+        return None
+    return data, image_format
+
+
+def optimize_presentation(prs):
+    # Merges duplicate and near-duplicate images of prs onto one part each and downscales or recompresses
+    # the parts kept. Returns a dict of counts and media byte totals.
+    media, relationships = collect_images(prs)
+    package = prs.part.package
+    stats = {'images': len(media), 'merged': 0, 'recompressed': 0,
+             'bytes_before': sum(len(part.blob) for part in media), 'bytes_after': 0}
+    replacement = {}
+    for group in _group(media):
+        kept = group[0]
+        unsized = any(item.unsized for item in group)
+        displays = None if unsized else [display for item in group for display in item.displays]
+        part = kept.part
+        optimized = _optimized_blob(kept, displays)
+        if optimized is not None:
+            data, image_format = optimized
+            ext, content_type = _FORMAT_CONTENT_TYPES[image_format]
+            partname = part.partname if part.partname.ext == ext else package.next_image_partname(ext)
+            part = ImagePart(partname, content_type, package, data)
+            stats['recompressed'] += 1
+        stats['merged'] += len(group) - 1
+        stats['bytes_after'] += len(part.blob)
+        for item in group:
+            replacement[item.part] = part
+        # Retarget now, so the next new partname is picked with this group's parts already replaced
+        for index, (source, rel) in enumerate(relationships):
+            if replacement.get(rel.target_part, rel.target_part) is not rel.target_part:
+                relationships[index] = source, retarget(source, rel, replacement[rel.target_part])
+    return stats
+
+
+def retarget(source, rel, target):
+    # Points an existing relationship (same rId) at another part. A _Relationship caches its target, so it is
+    # replaced rather than changed.
+    new_rel = _Relationship(rel._base_uri, rel.rId, rel.reltype, rel._target_mode, target)
+    source.rels._rels[rel.rId] = new_rel
+    return new_rel
+
+
+def optimize_file(input_path, output_path):
+    # Optimizes one deck and returns (input path, output path, stats, seconds)
+    import pptx
+
+    start = time.perf_counter()
+    prs = pptx.Presentation(input_path)
+    stats = optimize_presentation(prs)
+    save(prs, output_path)
+    stats['file_before'] = os.path.getsize(input_path)
+    stats['file_after'] = os.path.getsize(output_path)
+    return input_path, output_path, stats, time.perf_counter() - start
+
+
+def find_decks(paths):
+    decks = []
+    for path in paths:
+        if os.path.isdir(path):
+            decks.extend(glob.glob(os.path.join(path, '*.pptx')))
+        else:
+            decks.append(path)
+    return sorted(decks)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Merge duplicate and near-duplicate images of existing decks and downscale each image to "
+                    "its largest on-slide size, across worker processes.")
+    parser.add_argument('paths', nargs='+', help=".pptx files or directories of them")
+    parser.add_argument('--out-dir', default='optimized', help="where the optimized decks are written")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="number of worker processes")
+    args = parser.parse_args(argv)
+
+    decks = find_decks(args.paths)
+    if not decks:
+        print(f"No decks found in {', '.join(args.paths)}")
+        return 1
+    os.makedirs(args.out_dir, exist_ok=True)
+
+    start = time.perf_counter()
+    failures = 0
+    before = after = 0
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = {executor.submit(optimize_file, deck, os.path.join(args.out_dir, os.path.basename(deck))): deck
+                   for deck in decks}
+        for future in as_completed(futures):
+            try:
+                input_path, output_path, stats, seconds = future.result()
+            except Exception as e:
+                failures += 1
+                print(f"An error occurred while optimizing {futures[future]}: {e}")
+                continue
+            before += stats['file_before']
+            after += stats['file_after']
+            print(f"{input_path} -> {output_path}: {stats['images']} images, {stats['merged']} merged, "
+                  f"{stats['recompressed']} recompressed, {stats['file_before']} -> {stats['file_after']} bytes "
+                  f"({seconds:.2f}s)")
+    elapsed = time.perf_counter() - start
+
+    print(f"Optimized {len(decks) - failures} of {len(decks)} decks in {elapsed:.2f}s, "
+          f"{before} -> {after} bytes")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
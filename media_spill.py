@@ -0,0 +1,62 @@
+import os
+import shutil
+import tempfile
+import weakref
+
+from pptx.opc.constants import RELATIONSHIP_TYPE as RT
+from pptx.parts.image import Image, ImagePart
+
+
+class SpilledImagePart(ImagePart):
+    # An image part whose bytes stay in a file until the package is saved. pptx_save reads each one back
+    # as it is written, so at most one image is in memory at a time.
+
+    def __init__(self, partname, content_type, package, path, sha1, native_size, filename=None):
+        super().__init__(partname, content_type, package, None, filename)
+        self._path = path
+        self._sha1 = sha1
+        self._spilled_native_size = native_size
+
+    @property
+    def blob(self):
+        with open(self._path, 'rb') as f:
+            return f.read()
+
+    @property
+    def sha1(self):
+        return self._sha1
+
+    @property
+    def _native_size(self):
+        return self._spilled_native_size
+
+
+class MediaSpill:
+    # Writes encoded media to a temporary directory instead of keeping it in the package. The directory is
+    # removed when the spill is garbage-collected (or at exit), so keep it alive until the deck is saved.
+
+    def __init__(self, parent_dir=None):
+        self.path = tempfile.mkdtemp(prefix='powerpynt-media-', dir=parent_dir)
+        self.files = 0
+        self.bytes = 0
+        self._finalizer = weakref.finalize(self, shutil.rmtree, self.path, True)
+
+    def add_image(self, slide, data):
+        # Like slide.part.get_or_add_image_part(BytesIO(data)): returns (image part, rId), reusing an
+        # identical image already in the package
+        package = slide.part.package
+        image = Image.from_blob(data)
+        image_part = package._image_parts._find_by_sha1(image.sha1)
+        if image_part is None:
+            path = os.path.join(self.path, f"{image.sha1}.{image.ext}")
+            with open(path, 'wb') as f:
+                f.write(data)
+            self.files += 1
+            self.bytes += len(data)
+            native_size = ImagePart(None, image.content_type, package, data)._native_size
+            image_part = SpilledImagePart(package.next_image_partname(image.ext), image.content_type, package,
+                                          path, image.sha1, native_size)
+        return image_part, slide.part.relate_to(image_part, RT.IMAGE)
+
+    def cleanup(self):
+        self._finalizer()
@@ -0,0 +1,148 @@
+import io
+import os
+import sys
+import time
+import zipfile
+import zlib
+
+from pptx.opc.oxml import serialize_part_xml
+from pptx.opc.packuri import CONTENT_TYPES_URI, PACKAGE_URI
+from pptx.opc.serialized import _ContentTypesItem
+
+# Parts whose bytes are already compressed; deflating them again costs CPU and saves next to nothing
+STORED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'mp3', 'm4a', 'mp4', 'm4v', 'mov', 'wmv', 'xlsx', 'docx', 'zip'}
+
+# Deflate level for XML parts: 1 is fastest, 9 is smallest
+XML_COMPRESSLEVEL = int(os.environ.get("POWERPYNT_XML_LEVEL", "6"))
+
+# End of central directory record closing every package
+ZIP_END_BYTES = zipfile.sizeEndCentDir
+_DESCRIPTOR_BYTES = 16  # signature, CRC and both sizes
+
+# Fixed entry timestamp, so saving the same deck twice gives the same bytes
+ZIP_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+
+
+def package_items(prs):
+    # Yields (member name, bytes) in the same order python-pptx writes them. XML parts are serialized one at
+    # a time as the generator is consumed.
+    package = prs.part.package
+    parts = tuple(package.iter_parts())
+    yield CONTENT_TYPES_URI.membername, serialize_part_xml(_ContentTypesItem.xml_for(parts))
+    yield PACKAGE_URI.rels_uri.membername, package._rels.xml
+    for part in parts:
+        yield part.partname.membername, part.blob
+        if part._rels:
+            yield part.partname.rels_uri.membername, part.rels.xml
+
+
+def is_stored(member_name):
+    return member_name.rsplit('.', 1)[-1].lower() in STORED_EXTENSIONS
+
+
+def member_size(member_name, data_bytes, descriptor=True):
+    # Bytes one member takes in the zip: its local header, data, data descriptor (written when the stream
+    # can't seek, as with save()) and central directory entry
+    name_bytes = len(member_name.encode('utf-8'))
+    return (zipfile.sizeFileHeader + name_bytes + data_bytes + (_DESCRIPTOR_BYTES if descriptor else 0)
+            + zipfile.sizeCentralDir + name_bytes)
+
+
+def package_sizes(prs, xml_compresslevel=XML_COMPRESSLEVEL, descriptor=True):
+    # {member name: bytes it will take in the saved package}, without writing it: media counts as stored and
+    # XML parts are deflated the way write_items does. The package is this total plus ZIP_END_BYTES.
+    sizes = {}
+    for member_name, blob in package_items(prs):
+        if is_stored(member_name):
+            data_bytes = len(blob)
+        else:
+            compressor = zlib.compressobj(xml_compresslevel, zlib.DEFLATED, -15)
+            data_bytes = len(compressor.compress(blob)) + len(compressor.flush())
+        sizes[member_name] = member_size(member_name, data_bytes, descriptor)
+    return sizes
+
+
+def write_package(prs, stream, xml_compresslevel=XML_COMPRESSLEVEL):
+    # Writes the package to stream part by part. Media is written with ZIP_STORED and XML parts are deflated
+    # at xml_compresslevel. The stream does not need to be seekable.
+    write_items(package_items(prs), stream, xml_compresslevel)
+
+
+def write_items(items, stream, xml_compresslevel=XML_COMPRESSLEVEL):
+    # Writes (member name, bytes) pairs as a zip package, with the same per-part compression as write_package
+    with zipfile.ZipFile(stream, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+        for member_name, blob in items:
+            info = zipfile.ZipInfo(member_name, date_time=ZIP_DATE_TIME)
+            if is_stored(member_name):
+                info.compress_type = zipfile.ZIP_STORED
+                zf.writestr(info, blob)
+            else:
+                info.compress_type = zipfile.ZIP_DEFLATED
+                zf.writestr(info, blob, compresslevel=xml_compresslevel)
+
+
+def save_to_stream(prs, stream, xml_compresslevel=XML_COMPRESSLEVEL, streaming=False):
+    # Saves prs to any writable binary stream (file, BytesIO, socket file, HTTP response) and returns the
+    # number of bytes written. By default the package is assembled in memory and written in one go; with
+    # streaming=True each part goes straight out as it is serialized, so the whole package is never held
+    # in memory (the zip then uses data descriptors if the stream can't seek).
+    if streaming:
+        start = stream.tell() if stream.seekable() else None
+        counter = _CountingWriter(stream)
+        write_package(prs, counter, xml_compresslevel)
+        return counter.count if start is None else stream.tell() - start
+    buffer = io.BytesIO()
+    write_package(prs, buffer, xml_compresslevel)
+    stream.write(buffer.getbuffer())
+    return buffer.tell()
+
+
+def save(prs, path, xml_compresslevel=XML_COMPRESSLEVEL):
+    # Drop-in replacement for prs.save(path)
+    with open(path, 'wb') as f:
+        return save_to_stream(prs, f, xml_compresslevel, streaming=True)
+
+
+class _CountingWriter(io.RawIOBase):
+    # Forwards writes to a stream while counting bytes. It reports itself as unseekable, so zipfile never
+    # tries to seek back in streams like sockets.
+
+    def __init__(self, stream):
+        self._stream = stream
+        self.count = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        written = self._stream.write(data)
+        written = len(data) if written is None else written
+        self.count += written
+        return written
+
+    def flush(self):
+        self._stream.flush()
+
+
+def benchmark(pptx_path, repeat=5):
+    # Compares prs.save with save_to_stream at several deflate levels, all into memory
+    import pptx
+
+    prs = pptx.Presentation(pptx_path)
+    candidates = [('prs.save', lambda out: prs.save(out))]
+    for level in (1, 6, 9):
+        candidates.append((f'save_to_stream level={level}', lambda out, level=level: save_to_stream(prs, out, level)))
+    candidates.append(('save_to_stream streaming', lambda out: save_to_stream(prs, out, streaming=True)))
+
+    for name, save_fn in candidates:
+        timings = []
+        for _ in range(repeat):
+            out = io.BytesIO()
+            start = time.perf_counter()
+            save_fn(out)
+            timings.append(time.perf_counter() - start)
+        print(f"{name:30} {min(timings) * 1000:8.1f} ms  {len(out.getvalue()):>10} bytes")
+
+
+if __name__ == '__main__':
+    benchmark(sys.argv[1] if len(sys.argv) > 1 else 'Google_Glass_Failure_Presentation.pptx')
@@ -0,0 +1,402 @@
+import argparse
+import hashlib
+import io
+import json
+import os
+import re
+import sys
+import time
+
+from lxml import etree
+from PIL import Image, ImageDraw, ImageEnhance, ImageFont
+from pptx.opc.constants import RELATIONSHIP_TYPE as RT
+from pptx.oxml.ns import qn
+
+from image_cache import CACHE_VERSION, ImageCache
+from text_fit import (DEFAULT_FONT, DEFAULT_INSETS, DEFAULT_SIZE, EMU_PER_POINT, LINE_SPACING, find_font_file,
+                      font_metrics)
+
+# Width of one slide thumbnail in pixels
+PREVIEW_WIDTH = int(os.environ.get("POWERPYNT_PREVIEW_WIDTH", "320"))
+# Thumbnails per row of a contact sheet
+SHEET_COLUMNS = 4
+
+# Text smaller than this many pixels is unreadable in a thumbnail anyway, and is drawn as a bar instead of
+# glyphs (rendering glyphs is most of the cost of a preview)
+GREEK_BELOW = 9
+
+_SHEET_PADDING = 8
+_SHEET_LABEL_HEIGHT = 14
+_SHEET_BACKGROUND = (64, 64, 64)
+_CHART_FILL = (236, 236, 236)
+_CHART_LINE = (160, 160, 160)
+
+# Scheme colors used by shape styles and text, and the theme entries they stand for
+_SCHEME_ALIASES = {'tx1': 'dk1', 'bg1': 'lt1', 'tx2': 'dk2', 'bg2': 'lt2'}
+
+_A_BLIP = qn('a:blip')
+_A_BODYPR = qn('a:bodyPr')
+_A_DEFRPR = qn('a:defRPr')
+_A_ENDPARARPR = qn('a:endParaRPr')
+_A_EXT = qn('a:ext')
+_A_FILLREF = qn('a:fillRef')
+_A_FONTREF = qn('a:fontRef')
+_A_LATIN = qn('a:latin')
+_A_LSTSTYLE = qn('a:lstStyle')
+_A_LN = qn('a:ln')
+_A_LNREF = qn('a:lnRef')
+_A_LUM = qn('a:lum')
+_A_NOFILL = qn('a:noFill')
+_A_OFF = qn('a:off')
+_A_P = qn('a:p')
+_A_PPR = qn('a:pPr')
+_A_PRSTGEOM = qn('a:prstGeom')
+_A_R = qn('a:r')
+_A_RPR = qn('a:rPr')
+_A_SCHEMECLR = qn('a:schemeClr')
+_A_SOLIDFILL = qn('a:solidFill')
+_A_SRCRECT = qn('a:srcRect')
+_A_SRGBCLR = qn('a:srgbClr')
+_A_SYSCLR = qn('a:sysClr')
+_A_T = qn('a:t')
+_A_XFRM = qn('a:xfrm')
+_P_BLIPFILL = qn('p:blipFill')
+_P_GRAPHICFRAME = qn('p:graphicFrame')
+_P_GRPSP = qn('p:grpSp')
+_P_PIC = qn('p:pic')
+_P_SP = qn('p:sp')
+_P_SPPR = qn('p:spPr')
+_P_STYLE = qn('p:style')
+_P_TXBODY = qn('p:txBody')
+_P_XFRM = qn('p:xfrm')
+_R_EMBED = qn('r:embed')
+
+_LEVEL_TAGS = [qn(f'a:lvl{level}pPr') for level in range(1, 10)]
+_WORDS = re.compile(r'\S+|\s+')
+
+
+def brightness_for_lum(bright, contrast):
+    # Inverse of slide_helpers.lum_for_brightness: the brightness factor an <a:lum> stands for
+    contrast /= 100000
+    return 1 + contrast if contrast <= 0 else 1 / (1 - contrast)
+
+
+class PreviewRenderer:
+    # Draws slides as small images with Pillow: pictures from the image bytes already in the package,
+    # preset rectangles and ellipses with their fill and outline, text laid out with real font metrics
+    # where the font is installed, and charts and tables as grey boxes. Decoded pictures, fonts and theme
+    # colors are shared between all slides rendered by one PreviewRenderer.
+
+    def __init__(self, prs, width=PREVIEW_WIDTH, cache=None):
+        self.prs = prs
+        self.cache = cache  # ImageCache that keeps scaled pictures between runs, or None
+        self.width = width
+        self.scale = width / prs.slide_width  # pixels per EMU
+        self.height = max(1, round(prs.slide_height * self.scale))
+        self._pictures = {}  # (image part, crop, lum, size) -> RGBA image
+        self._fonts = {}  # (typeface, bold, pixel size) -> ImageFont
+        self._themes = {}  # slide master part -> {scheme name: RGB}
+
+    # Slides
+
+    def render_slide(self, slide):
+        image = Image.new('RGB', (self.width, self.height), (255, 255, 255))
+        draw = ImageDraw.Draw(image)
+        colors = self._theme_colors(slide)
+        self._draw_tree(image, draw, slide.part, slide.shapes._spTree, colors)
+        return image
+
+    def contact_sheet(self, columns=SHEET_COLUMNS):
+        slides = list(self.prs.slides)
+        rows = max(1, -(-len(slides) // columns))
+        cell_width = self.width + _SHEET_PADDING
+        cell_height = self.height + _SHEET_PADDING + _SHEET_LABEL_HEIGHT
+        sheet = Image.new('RGB', (columns * cell_width + _SHEET_PADDING, rows * cell_height + _SHEET_PADDING),
+                          _SHEET_BACKGROUND)
+        draw = ImageDraw.Draw(sheet)
+        label_font = ImageFont.load_default()
+        for index, slide in enumerate(slides):
+            left = _SHEET_PADDING + index % columns * cell_width
+            top = _SHEET_PADDING + index // columns * cell_height
+            sheet.paste(self.render_slide(slide), (left, top))
+            draw.text((left, top + self.height + 2), str(index + 1), fill=(255, 255, 255), font=label_font)
+        return sheet
+
+    def _draw_tree(self, image, draw, part, tree, colors):
+        for element in tree:
+            if element.tag == _P_PIC:
+                self._draw_picture(image, part, element)
+            elif element.tag == _P_SP:
+                self._draw_shape(draw, element, colors)
+            elif element.tag == _P_GRAPHICFRAME:
+                box = self._box(element.find(_P_XFRM))
+                if box is not None:
+                    draw.rectangle(box, fill=_CHART_FILL, outline=_CHART_LINE)
+            elif element.tag == _P_GRPSP:
+                self._draw_tree(image, draw, part, element, colors)
+
+    def _box(self, xfrm):
+        # Pixel box (left, top, right, bottom) of an <a:xfrm> or <p:xfrm>, or None
+        if xfrm is None:
+            return None
+        off, ext = xfrm.find(_A_OFF), xfrm.find(_A_EXT)
+        if off is None or ext is None:
+            return None
+        left, top = int(off.get('x')) * self.scale, int(off.get('y')) * self.scale
+        return (round(left), round(top),
+                round(left + int(ext.get('cx')) * self.scale) - 1, round(top + int(ext.get('cy')) * self.scale) - 1)
+
+    # Pictures
+
+    def _draw_picture(self, image, part, pic):
+        box = self._box(pic.find(f"{_P_SPPR}/{_A_XFRM}"))
+        blip_fill = pic.find(_P_BLIPFILL)
+        blip = blip_fill.find(_A_BLIP) if blip_fill is not None else None
+        if box is None or blip is None or blip.get(_R_EMBED) not in part.rels:
+            return
+        size = (max(1, box[2] - box[0] + 1), max(1, box[3] - box[1] + 1))
+        src_rect = blip_fill.find(_A_SRCRECT)
+        crop = tuple(int(src_rect.get(side, 0)) for side in 'ltrb') if src_rect is not None else None
+        lum = blip.find(_A_LUM)
+        lum = (int(lum.get('bright', 0)), int(lum.get('contrast', 0))) if lum is not None else None
+        picture = self._picture(part.rels[blip.get(_R_EMBED)].target_part, crop, lum, size)
+        if picture is not None:
+            image.paste(picture, box[:2], picture)
+
+    def _picture(self, image_part, crop, lum, size):
+        key = (image_part, crop, lum, size)
+        picture = self._pictures.get(key)
+        if picture is None and key not in self._pictures:
+            try:
+                picture = self._cached_picture(image_part, crop, lum, size)
+            except (OSError, ValueError):  # EMF, WMF and other formats Pillow can't draw
+                picture = None
+            self._pictures[key] = picture
+        return picture
+
+    def _cached_picture(self, image_part, crop, lum, size):
+        # Decoding full-size PNGs is most of the cost of a preview, so the scaled result is kept in the image
+        # cache as a small PNG, keyed by the hash of the picture the build embedded
+        if self.cache is None:
+            return self._load_picture(image_part.blob, crop, lum, size)
+        payload = json.dumps({'v': CACHE_VERSION, 'preview': image_part.sha1, 'crop': crop, 'lum': lum, 'size': size},
+                             sort_keys=True)
+        key = hashlib.sha256(payload.encode('utf-8')).hexdigest()
+        data = self.cache.get(key)
+        if data is not None:
+            with Image.open(io.BytesIO(data)) as picture:
+                return picture.convert('RGBA')
+        picture = self._load_picture(image_part.blob, crop, lum, size)
+        buffer = io.BytesIO()
+        picture.save(buffer, 'PNG', compress_level=1)
+        self.cache.put(key, buffer.getvalue())
+        return picture
+
+    def _load_picture(self, blob, crop, lum, size):
+        with Image.open(io.BytesIO(blob)) as source:
+            if source.format == 'JPEG':
+                source.draft('RGB', size)  # decode at 1/2, 1/4 or 1/8 scale when that still covers size
+            picture = source if source.mode in ('RGB', 'RGBA') else source.convert('RGBA')
+            if crop is not None:
+                left, top, right, bottom = (value / 100000 for value in crop)
+                picture = picture.crop((round(picture.width * left), round(picture.height * top),
+                                        round(picture.width * (1 - right)), round(picture.height * (1 - bottom))))
+            picture = picture.resize(size, Image.BILINEAR, reducing_gap=2.0)  # before convert, on fewer pixels
+        if picture.mode != 'RGBA':
+            picture = picture.convert('RGBA')
+        if lum is not None:
+            alpha = picture.getchannel('A')
+            picture = ImageEnhance.Brightness(picture.convert('RGB')).enhance(brightness_for_lum(*lum))
+            picture.putalpha(alpha)
+        return picture
+
+    # Shapes and text
+
+    def _draw_shape(self, draw, sp, colors):
+        box = self._box(sp.find(f"{_P_SPPR}/{_A_XFRM}"))
+        if box is None:
+            return
+        spPr = sp.find(_P_SPPR)
+        style = sp.find(_P_STYLE)
+        fill = _fill_color(spPr, colors)
+        if fill is None and spPr.find(_A_NOFILL) is None and style is not None:
+            fill = _color(style.find(_A_FILLREF), colors)
+        ln = spPr.find(_A_LN)
+        outline = _fill_color(ln, colors) if ln is not None else None
+        if outline is None and (ln is None or ln.find(_A_NOFILL) is None) and style is not None:
+            outline = _color(style.find(_A_LNREF), colors)
+        geometry = spPr.find(_A_PRSTGEOM)
+        shape = geometry.get('prst') if geometry is not None else 'rect'
+        if fill is not None or outline is not None:
+            if shape == 'ellipse':
+                draw.ellipse(box, fill=fill, outline=outline)
+            elif shape == 'roundRect':
+                draw.rounded_rectangle(box, radius=min(box[2] - box[0], box[3] - box[1]) // 6,
+                                       fill=fill, outline=outline)
+            else:
+                draw.rectangle(box, fill=fill, outline=outline)
+        txBody = sp.find(_P_TXBODY)
+        if txBody is not None:
+            text_color = _color(style.find(_A_FONTREF), colors) if style is not None else None
+            self._draw_text(draw, txBody, box, text_color or colors.get('dk1', (0, 0, 0)), colors)
+
+    def _font(self, typeface, bold, pixels):
+        key = (typeface, bold, pixels)
+        font = self._fonts.get(key)
+        if font is None:
+            path = find_font_file(typeface, bold)
+            font = self._fonts[key] = (ImageFont.truetype(path, pixels) if path is not None
+                                       else ImageFont.load_default(pixels))
+        return font
+
+    def _run_style(self, rPr, default, colors):
+        # (typeface, bold, size in pt, color) of a run, given the paragraph's defaults
+        if rPr is None:
+            return default
+        typeface, bold, size, color = default
+        latin = rPr.find(_A_LATIN)
+        return (latin.get('typeface', typeface) if latin is not None else typeface,
+                rPr.get('b') in ('1', 'true') if rPr.get('b') is not None else bold,
+                int(rPr.get('sz')) / 100 if rPr.get('sz') is not None else size,
+                _fill_color(rPr, colors) or color)
+
+    def _draw_text(self, draw, txBody, box, color, colors):
+        bodyPr = txBody.find(_A_BODYPR)
+        insets = {name: int(bodyPr.get(name, default)) * self.scale if bodyPr is not None else default * self.scale
+                  for name, default in DEFAULT_INSETS.items()}
+        wraps = bodyPr is None or bodyPr.get('wrap') != 'none'
+        left, right = box[0] + insets['lIns'], box[2] - insets['rIns']
+        available = right - left if wraps else None
+        lines = []  # (height, width, alignment, [(x offset, width, text, font or greeked pixel size, color)])
+        # Run defaults of each paragraph level, from the frame's list style (see text_styles.py)
+        list_style = txBody.find(_A_LSTSTYLE)
+        levels = [self._run_style(list_style.find(f'{tag}/{_A_DEFRPR}') if list_style is not None else None,
+                                  (DEFAULT_FONT, False, DEFAULT_SIZE, color), colors) for tag in _LEVEL_TAGS]
+        for p in txBody.iter(_A_P):
+            pPr = p.find(_A_PPR)
+            default = levels[0]
+            if pPr is not None:
+                default = self._run_style(pPr.find(_A_DEFRPR), levels[int(pPr.get('lvl', 0))], colors)
+            alignment = pPr.get('algn', 'l') if pPr is not None else 'l'
+            line, line_width, line_height = [], 0.0, 0.0
+            for r in p.iter(_A_R):
+                typeface, bold, size, run_color = self._run_style(r.find(_A_RPR), default, colors)
+                pixels = max(1, round(size * EMU_PER_POINT * self.scale))
+                font = self._font(typeface, bold, pixels) if pixels >= GREEK_BELOW else pixels
+                metrics = font_metrics(typeface, bold)
+                for word in _WORDS.findall(r.findtext(_A_T) or ''):
+                    word_width = metrics.word(word) * pixels
+                    if available is not None and line and not word.isspace() and line_width + word_width > available:
+                        lines.append((line_height, line_width, alignment, line))
+                        line, line_width, line_height = [], 0.0, 0.0
+                    if word.isspace() and not line:
+                        continue
+                    if isinstance(font, int):
+                        if not word.isspace():  # one bar per word, so the gaps between words show
+                            line.append((line_width, word_width, word, font, run_color))
+                    elif line and line[-1][3] is font and line[-1][4] == run_color:
+                        offset, width, text, _, _ = line[-1]  # one draw call per run of glyphs
+                        line[-1] = (offset, width + word_width, text + word, font, run_color)
+                    else:
+                        line.append((line_width, word_width, word, font, run_color))
+                    line_width += word_width
+                    line_height = max(line_height, pixels * LINE_SPACING)
+            if not line:
+                end = self._run_style(p.find(_A_ENDPARARPR), default, colors)
+                line_height = end[2] * EMU_PER_POINT * self.scale * LINE_SPACING
+            lines.append((line_height, line_width, alignment, line))
+        anchor = bodyPr.get('anchor', 't') if bodyPr is not None else 't'
+        top, bottom = box[1] + insets['tIns'], box[3] - insets['bIns']
+        text_height = sum(height for height, _, _, _ in lines)
+        y = {'ctr': (top + bottom - text_height) / 2, 'b': bottom - text_height}.get(anchor, top)
+        for height, width, alignment, line in lines:
+            x = {'ctr': (box[0] + box[2] - width) / 2, 'r': right - width}.get(alignment, left)
+            for offset, width, word, font, word_color in line:
+                if isinstance(font, int):  # greeked: a bar as high as lowercase letters
+                    draw.rectangle((x + offset, y + font * 0.4, x + offset + max(1, width - 1), y + font * 0.9),
+                                   fill=word_color)
+                else:
+                    draw.text((x + offset, y), word, fill=word_color, font=font)
+            y += height
+
+    def _theme_colors(self, slide):
+        master_part = slide.part.slide_layout.slide_master.part
+        colors = self._themes.get(master_part)
+        if colors is None:
+            colors = self._themes[master_part] = {}
+            try:
+                theme = etree.fromstring(master_part.part_related_by(RT.THEME).blob)
+            except KeyError:
+                return colors
+            for scheme in theme.iter(qn('a:clrScheme')):
+                for entry in scheme:
+                    value = entry.find(_A_SRGBCLR)
+                    if value is None:
+                        value = entry.find(_A_SYSCLR)
+                    if value is not None:
+                        hex_value = value.get('val') if value.tag == _A_SRGBCLR else value.get('lastClr')
+                        if hex_value:
+                            colors[etree.QName(entry).localname] = _rgb(hex_value)
+                break
+        return colors
+
+
+def _rgb(hex_value):
+    return tuple(int(hex_value[index:index + 2], 16) for index in (0, 2, 4))
+
+
+def _color(element, colors):
+    # The color set directly inside element (<a:srgbClr> or <a:schemeClr>), or None
+    if element is None:
+        return None
+    value = element.find(_A_SRGBCLR)
+    if value is not None:
+        return _rgb(value.get('val'))
+    value = element.find(_A_SCHEMECLR)
+    if value is not None:
+        name = value.get('val')
+        return colors.get(_SCHEME_ALIASES.get(name, name))
+    return None
+
+
+def _fill_color(element, colors):
+    # The <a:solidFill> color of an spPr, ln or rPr element, or None
+    if element is None:
+        return None
+    return _color(element.find(_A_SOLIDFILL), colors)
+
+
+def contact_sheet(prs, width=PREVIEW_WIDTH, columns=SHEET_COLUMNS, cache=None):
+    # One image with a thumbnail of every slide of prs, numbered
+    return PreviewRenderer(prs, width, cache).contact_sheet(columns)
+
+
+def main(argv=None):
+    import pptx
+
+    parser = argparse.ArgumentParser(description="Draw a contact sheet of a deck's slides with Pillow.")
+    parser.add_argument('pptx', help="deck to preview")
+    parser.add_argument('-o', '--output', help="contact sheet PNG (default: <deck>.preview.png)")
+    parser.add_argument('--width', type=int, default=PREVIEW_WIDTH, help="width of each slide thumbnail in pixels")
+    parser.add_argument('--columns', type=int, default=SHEET_COLUMNS, help="thumbnails per row")
+    parser.add_argument('--slides-dir', help="also write each slide as slide<N>.png in this directory")
+    parser.add_argument('--no-cache', action='store_true', help="don't keep scaled pictures in the image cache")
+    args = parser.parse_args(argv)
+
+    prs = pptx.Presentation(args.pptx)
+    start = time.perf_counter()
+    renderer = PreviewRenderer(prs, args.width, None if args.no_cache else ImageCache())
+    sheet = renderer.contact_sheet(args.columns)
+    elapsed = time.perf_counter() - start
+    output = args.output or os.path.splitext(args.pptx)[0] + '.preview.png'
+    sheet.save(output)
+    if args.slides_dir:
+        os.makedirs(args.slides_dir, exist_ok=True)
+        for number, slide in enumerate(prs.slides, start=1):
+            renderer.render_slide(slide).save(os.path.join(args.slides_dir, f"slide{number}.png"))
+    print(f"Drew {len(prs.slides)} slides in {elapsed * 1000:.0f} ms -> {output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,207 @@
+import functools
+import json
+import os
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+from lxml import etree
+
+# Profiling is off unless POWERPYNT_PROFILE is set (or Main_File.py is run with --profile)
+PROFILE_ENABLED = os.environ.get("POWERPYNT_PROFILE", "") not in ("", "0")
+PROFILE_REPORT = os.environ.get("POWERPYNT_PROFILE_REPORT", "profile_report.json")
+
+# The profiler in use, or None. Profiled helpers check this on every call, so when it's None they cost
+# one global lookup.
+_active = None
+
+
+def enable():
+    # Starts a new BuildProfiler and makes it the active one
+    global _active
+    _active = BuildProfiler()
+    _active.start()
+    return _active
+
+
+def disable():
+    global _active
+    if _active is not None:
+        _active.stop()
+    _active = None
+
+
+def active_profiler():
+    return _active
+
+
+def _xml_size(element):
+    return len(etree.tostring(element)) if element is not None else 0
+
+
+class _Frame:
+    __slots__ = ('kind', 'label', 'slide', 'element', 'xml_before', 'image_in', 'image_out', 'extra_xml',
+                 'start_wall', 'start_cpu', 'start_memory', 'max_peak')
+
+
+class BuildProfiler:
+    # Records wall time, CPU time, tracemalloc peak, image bytes in/out and XML size added for each slide and
+    # each profiled helper call. Frames nest: a helper call inside a slide is attributed to that slide, and
+    # the slide's peak includes the peaks of its calls. tracemalloc only sees memory allocated through Python,
+    # so Pillow's pixel buffers are not part of the peaks; image bytes in/out show the image side instead.
+
+    def __init__(self):
+        self.records = []
+        self._stack = []
+        self._started_tracing = False
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+
+    def stop(self):
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def _current_slide(self):
+        for frame in reversed(self._stack):
+            if frame.kind == 'slide':
+                return frame.slide
+        return None
+
+    @contextmanager
+    def measure(self, kind, label, element=None, slide=None, image_in=None):
+        # Yields the frame; set frame.element (if the XML only exists after the block), frame.image_out or
+        # frame.extra_xml inside the block to have them recorded
+        if self._stack:
+            parent = self._stack[-1]
+            parent.max_peak = max(parent.max_peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+        frame = _Frame()
+        frame.kind = kind
+        frame.label = label
+        frame.slide = slide if slide is not None else self._current_slide()
+        frame.element = element
+        frame.xml_before = _xml_size(element)
+        frame.image_in = image_in
+        frame.image_out = None
+        frame.extra_xml = 0
+        frame.start_memory = tracemalloc.get_traced_memory()[0]
+        frame.max_peak = 0
+        self._stack.append(frame)
+        frame.start_cpu = time.process_time()
+        frame.start_wall = time.perf_counter()
+        try:
+            yield frame
+        finally:
+            wall = time.perf_counter() - frame.start_wall
+            cpu = time.process_time() - frame.start_cpu
+            self._stack.pop()
+            peak = max(frame.max_peak, tracemalloc.get_traced_memory()[1])
+            if self._stack:
+                self._stack[-1].max_peak = max(self._stack[-1].max_peak, peak)
+            self.records.append({
+                'kind': kind,
+                'label': label,
+                'slide': frame.slide,
+                'wall_seconds': wall,
+                'cpu_seconds': cpu,
+                'peak_bytes': max(0, peak - frame.start_memory),
+                'image_bytes_in': frame.image_in,
+                'image_bytes_out': frame.image_out,
+                'xml_bytes_added': _xml_size(frame.element) - frame.xml_before + frame.extra_xml,
+            })
+
+    def report(self):
+        totals = {}
+        for record in self.records:
+            if record['kind'] != 'call':
+                continue
+            total = totals.setdefault(record['label'], {'calls': 0, 'wall_seconds': 0.0, 'cpu_seconds': 0.0})
+            total['calls'] += 1
+            total['wall_seconds'] += record['wall_seconds']
+            total['cpu_seconds'] += record['cpu_seconds']
+        return {
+            'slides': [record for record in self.records if record['kind'] == 'slide'],
+            'calls': [record for record in self.records if record['kind'] == 'call'],
+            'other': [record for record in self.records if record['kind'] not in ('slide', 'call')],
+            'totals_by_helper': totals,
+        }
+
+    def write_report(self, path=PROFILE_REPORT):
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=2)
+
+    def summary_table(self, top_n=10):
+        rows = sorted(self.records, key=lambda record: record['wall_seconds'], reverse=True)[:top_n]
+        lines = [f"{'kind':<6} {'label':<38} {'slide':>5} {'wall ms':>9} {'cpu ms':>9} {'peak KB':>9} "
+                 f"{'img in KB':>10} {'img out KB':>10} {'xml KB':>8}"]
+
+        def kb(value):
+            return f"{value / 1024:.1f}" if value is not None else '-'
+
+        for record in rows:
+            lines.append(
+                f"{record['kind']:<6} {record['label'][:38]:<38} {record['slide'] or '-':>5} "
+                f"{record['wall_seconds'] * 1000:>9.1f} {record['cpu_seconds'] * 1000:>9.1f} "
+                f"{kb(record['peak_bytes']):>9} {kb(record['image_bytes_in']):>10} "
+                f"{kb(record['image_bytes_out']):>10} {kb(record['xml_bytes_added']):>8}")
+        return '\n'.join(lines)
+
+
+def _picture_bytes(picture):
+    # Size of the embedded image, or None while it is still being produced (deferred pictures)
+    if picture is None or not picture._element.blip_rId:
+        return None
+    return len(picture.image.blob)
+
+
+def profiled(label, slide_arg=0, image_arg=None, element=lambda slide: slide._element, chart=False):
+    # Decorator recording each call of a helper in the active profiler. slide_arg is the position of the
+    # slide (or paragraph) argument that element() maps to the XML being measured; image_arg is the position
+    # of an image path argument. Helpers returning a picture get its image size recorded.
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            profiler = _active
+            if profiler is None:
+                return fn(*args, **kwargs)
+            image_in = None
+            if image_arg is not None and len(args) > image_arg:
+                try:
+                    image_in = os.path.getsize(args[image_arg])
+                except OSError:
+                    pass
+            with profiler.measure('call', label, element(args[slide_arg]), image_in=image_in) as frame:
+                result = fn(*args, **kwargs)
+                if chart:
+                    frame.extra_xml = len(result.chart.part.blob)
+                elif image_arg is not None:
+                    frame.image_out = _picture_bytes(result)
+            return result
+        return wrapper
+    return decorate
+
+
+@contextmanager
+def profile_slide(index):
+    # Measures the slide built inside the block. Set frame.element to the slide's XML element once it exists.
+    profiler = _active
+    if profiler is None:
+        yield None
+        return
+    with profiler.measure('slide', f"slide {index}", slide=index) as frame:
+        yield frame
+
+
+@contextmanager
+def profile_step(label):
+    # Measures any other step, e.g. saving the deck
+    profiler = _active
+    if profiler is None:
+        yield None
+        return
+    with profiler.measure('step', label) as frame:
+        yield frame
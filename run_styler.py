@@ -0,0 +1,111 @@
+import functools
+import re
+
+from lxml import etree
+from pptx.oxml.ns import qn
+from pptx.util import Pt
+
+from profiling import profiled
+
+_R = qn('a:r')
+_RPR = qn('a:rPr')
+_SOLID_FILL = qn('a:solidFill')
+_SRGB_CLR = qn('a:srgbClr')
+_LATIN = qn('a:latin')
+_T = qn('a:t')
+_END_PARA_RPR = qn('a:endParaRPr')
+
+# Same escaping python-pptx applies to run text: control characters other than tab and line feed
+_CTRL_CHARS = re.compile(r'([\x00-\x08\x0B-\x1F])')
+
+
+def _escape_ctrl_chars(text):
+    return _CTRL_CHARS.sub(lambda match: "_x%04X_" % ord(match.group(1)), text)
+
+
+class RunStyler:
+    # Adds text to paragraphs with brand keywords picked out in their own colors.
+    #
+    # keywords maps each keyword, spelled the way it should always appear, to either one color for the
+    # whole word, a list with one color per character, or a list with one color per word (for phrases).
+    # Colors are hex strings or RGBColor. Keywords are matched case-insensitively, anywhere in the text,
+    # in a single pass of one precompiled pattern. Runs are written straight into the paragraph XML, and
+    # neighbouring pieces with the same formatting share one run.
+
+    def __init__(self, keywords, keyword_bold=False, cache_size=4096):
+        self.keyword_bold = keyword_bold
+        self._canonical = {}  # lowercased keyword -> canonical spelling
+        self._colored = {}  # lowercased keyword -> ((text, color, bold), ...) for use_special_colors
+        for keyword, colors in keywords.items():
+            self._canonical[keyword.lower()] = keyword
+            self._colored[keyword.lower()] = tuple(
+                (piece, color, keyword_bold) for piece, color in self._color_pieces(keyword, colors))
+        alternation = '|'.join(re.escape(keyword) for keyword in sorted(keywords, key=len, reverse=True))
+        self._pattern = re.compile(alternation, re.IGNORECASE)
+        self._split = functools.lru_cache(maxsize=cache_size)(self._split_text)
+
+    @staticmethod
+    def _color_pieces(keyword, colors):
+        if not isinstance(colors, (list, tuple)):
+            return [(keyword, str(colors))]
+        colors = [str(color) for color in colors]
+        if len(colors) == len(keyword):
+            return list(zip(keyword, colors))
+        words = re.findall(r'\S+\s*', keyword)
+        if len(colors) == len(words):
+            return list(zip(words, colors))
+        raise ValueError(f"{keyword!r} needs one color, one per character or one per word, got {len(colors)}")
+
+    def _split_text(self, text):
+        # Returns ((piece, lowercased keyword or None), ...)
+        pieces = []
+        position = 0
+        for match in self._pattern.finditer(text):
+            if match.start() > position:
+                pieces.append((text[position:match.start()], None))
+            pieces.append((match.group(), match.group().lower()))
+            position = match.end()
+        if position < len(text):
+            pieces.append((text[position:], None))
+        return tuple(pieces)
+
+    # Paragraph records of slide_model.py have no XML yet, so there is nothing to measure for them
+    @profiled('add_colored_google_text', slide_arg=1, element=lambda paragraph: getattr(paragraph, '_p', None))
+    def add_text(self, paragraph, text, font_name, font_size, is_bold, default_color_rgb, use_special_colors=True):
+        # Text outside keywords gets default_color_rgb and is_bold. Keywords always use their canonical
+        # spelling and keyword_bold; with use_special_colors=False they take the default color too.
+        default_color = str(default_color_rgb)
+        runs = []  # [text, color, bold]
+        for piece, keyword in self._split(text):
+            if keyword is None:
+                styled = ((piece, default_color, is_bold),)
+            elif use_special_colors:
+                styled = self._colored[keyword]
+            else:
+                styled = ((self._canonical[keyword], default_color, self.keyword_bold),)
+            for run_text, color, bold in styled:
+                if runs and runs[-1][1] == color and runs[-1][2] == bold:
+                    runs[-1][0] += run_text
+                else:
+                    runs.append([run_text, color, bold])
+        if hasattr(paragraph, 'add_styled_runs'):  # a slide_model.ParagraphRecord
+            paragraph.add_styled_runs(runs, font_name, font_size)
+        else:
+            self._append_runs(paragraph._p, runs, font_name, str(Pt(font_size).centipoints))
+
+    @staticmethod
+    def _append_runs(p, runs, font_name, size):
+        # Same XML python-pptx produces for add_run() plus the name/size/bold/color setters
+        end_para_rPr = p.find(_END_PARA_RPR)
+        for text, color, bold in runs:
+            r = p.makeelement(_R, {})
+            rPr = etree.SubElement(r, _RPR)
+            rPr.set('sz', size)
+            rPr.set('b', '1' if bold else '0')
+            etree.SubElement(etree.SubElement(rPr, _SOLID_FILL), _SRGB_CLR).set('val', color)
+            etree.SubElement(rPr, _LATIN).set('typeface', font_name)
+            etree.SubElement(r, _T).text = _escape_ctrl_chars(text)
+            if end_para_rPr is None:
+                p.append(r)
+            else:
+                end_para_rPr.addprevious(r)
@@ -0,0 +1,251 @@
+import array
+import math
+import mmap
+import os
+import tempfile
+
+from pptx.chart.data import CategoryChartData
+from pptx.enum.chart import XL_CHART_TYPE
+from xlsxwriter import Workbook
+
+from image_pipeline import target_pixels
+from profiling import profiled
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; plain sequences and array('d') columns work without it
+    np = None
+
+# Name of the worksheet that keeps every point; Sheet1 holds the points actually drawn
+FULL_DATA_SHEET = 'Full data'
+
+
+def read_csv_columns(csv_path, columns):
+    # Reads the named columns of a plain comma-separated file (header row, no quoted fields) through a memory
+    # map, so only the requested columns are ever held in memory. A column is numeric when its first non-empty
+    # field is a number; numeric columns come back as array('d') (or NumPy arrays when NumPy is installed),
+    # with NaN for empty or unparsable fields, anything else as a list of str.
+    if os.path.getsize(csv_path) == 0:
+        raise ValueError(f"{csv_path}: the file is empty, expected a header row")
+    with open(csv_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        header = mm.readline().decode('utf-8-sig').rstrip('\r\n').split(',')
+        positions = [header.index(name) for name in columns]
+        data_start = mm.tell()
+        # The first pass only reads as far as the first non-empty field of every column, usually one line
+        numeric = [None] * len(columns)
+        for line in iter(mm.readline, b''):
+            fields = line.rstrip(b'\r\n').split(b',')
+            if len(fields) < len(header):
+                continue
+            for index, position in enumerate(positions):
+                if numeric[index] is None and fields[position].strip():
+                    numeric[index] = _is_number(fields[position])
+            if None not in numeric:
+                break
+        mm.seek(data_start)
+        values = [array.array('d') if is_number is not False else [] for is_number in numeric]
+        for line in iter(mm.readline, b''):
+            fields = line.rstrip(b'\r\n').split(b',')
+            if len(fields) < len(header):
+                continue  # blank or truncated line
+            for column, position, is_number in zip(values, positions, numeric):
+                field = fields[position]
+                if is_number is False:
+                    column.append(field.decode('utf-8'))
+                else:
+                    try:
+                        column.append(float(field))
+                    except ValueError:
+                        column.append(math.nan)  # missing point
+    if np is not None:
+        values = [np.frombuffer(column, dtype=np.float64) if isinstance(column, array.array) else column
+                  for column in values]
+    return dict(zip(columns, values))
+
+
+def _is_number(field):
+    try:
+        float(field)
+    except ValueError:
+        return False
+    return True
+
+
+# Downsampling. Both methods return sorted indices into the series and always keep the first and last point.
+
+def lttb_indices(values, threshold):
+    # Largest-Triangle-Three-Buckets: keeps the point of each bucket forming the largest triangle with the
+    # point kept before it and the average of the next bucket, which preserves the visual shape of a line
+    n = len(values)
+    if threshold >= n or threshold < 3:
+        return list(range(n))
+    if np is not None:
+        values = np.asarray(values, dtype=np.float64)
+    every = (n - 2) / (threshold - 2)
+    kept = [0]
+    a = 0
+    for bucket in range(threshold - 2):
+        range_start = int(bucket * every) + 1
+        range_end = int((bucket + 1) * every) + 1
+        avg_start = range_end
+        avg_end = min(int((bucket + 2) * every) + 1, n)
+        avg_x = (avg_start + avg_end - 1) / 2
+        a_y = values[a]
+        if np is not None:
+            avg_y = values[avg_start:avg_end].mean()
+            candidates = np.arange(range_start, range_end)
+            areas = np.abs((a - avg_x) * (values[range_start:range_end] - a_y) - (a - candidates) * (avg_y - a_y))
+            a = range_start + int(areas.argmax())
+        else:
+            avg_y = sum(values[avg_start:avg_end]) / (avg_end - avg_start)
+            max_area = -1.0
+            for j in range(range_start, range_end):
+                area = abs((a - avg_x) * (values[j] - a_y) - (a - j) * (avg_y - a_y))
+                if area > max_area:
+                    max_area = area
+                    next_a = j
+            a = next_a
+        kept.append(a)
+    kept.append(n - 1)
+    return kept
+
+
+def minmax_indices(values, max_points):
+    # Min/max bucketing: keeps the lowest and highest point of each bucket, so spikes are never lost
+    n = len(values)
+    buckets = max(1, (max_points - 2) // 2)
+    if max_points >= n or n <= 2:
+        return list(range(n))
+    size = math.ceil((n - 2) / buckets)
+    kept = {0, n - 1}
+    if np is not None:
+        values = np.asarray(values, dtype=np.float64)
+        whole = (n - 2) // size * size
+        blocks = values[1:1 + whole].reshape(-1, size)
+        offsets = np.arange(0, whole, size) + 1
+        kept.update((blocks.argmin(axis=1) + offsets).tolist())
+        kept.update((blocks.argmax(axis=1) + offsets).tolist())
+        starts = [1 + whole] if whole < n - 2 else []
+    else:
+        starts = range(1, n - 1, size)
+    for start in starts:
+        end = min(start + size, n - 1)
+        bucket = values[start:end]
+        kept.add(start + min(range(len(bucket)), key=bucket.__getitem__))
+        kept.add(start + max(range(len(bucket)), key=bucket.__getitem__))
+    return sorted(kept)
+
+
+DOWNSAMPLERS = {
+    'lttb': lttb_indices,
+    'minmax': minmax_indices,
+}
+
+
+def downsample_indices(series_values, max_points, method='lttb'):
+    # Category charts share one set of categories, so the points kept for each series are merged. With
+    # several series the chart can show up to max_points per series.
+    downsample = DOWNSAMPLERS[method]
+    if len(series_values) == 1:
+        return _downsample_present(downsample, series_values[0], max_points)
+    kept = set()
+    for values in series_values:
+        kept.update(_downsample_present(downsample, values, max_points))
+    return sorted(kept)
+
+
+def _downsample_present(downsample, values, max_points):
+    # Missing points (NaN) are left out before downsampling and the indices kept are mapped back to values
+    if np is not None:
+        values = np.asarray(values, dtype=np.float64)
+        present = np.flatnonzero(~np.isnan(values))
+        if len(present) == len(values):
+            return downsample(values, max_points)
+        return present[np.asarray(downsample(values[present], max_points), dtype=np.intp)].tolist()
+    present = [index for index, value in enumerate(values) if value == value]
+    if len(present) == len(values):
+        return downsample(values, max_points)
+    return [present[index] for index in downsample([values[index] for index in present], max_points)]
+
+
+def _take(values, indices):
+    if np is not None and isinstance(values, np.ndarray):
+        return values[np.asarray(indices, dtype=np.intp)].tolist()
+    return [values[index] for index in indices]
+
+
+def _take_points(values, indices):
+    # Like _take, with missing points (NaN) as None, which the chart leaves as gaps
+    return [None if value != value else value for value in _take(values, indices)]
+
+
+class SeriesChartData(CategoryChartData):
+    # Chart data for the points drawn, whose embedded workbook also keeps every point on a second sheet.
+    # The workbook is written with xlsxwriter's constant_memory mode, row by row through a temporary file,
+    # so its size does not depend on how many points there are.
+
+    def __init__(self, full_categories, full_series, number_format='General'):
+        super().__init__(number_format)
+        self.full_categories = full_categories
+        self.full_series = full_series  # [(name, values)]
+
+    @property
+    def xlsx_blob(self):
+        fd, path = tempfile.mkstemp(suffix='.xlsx')
+        os.close(fd)
+        try:
+            workbook = Workbook(path, {'constant_memory': True, 'nan_inf_to_errors': True})
+            self._write_drawn_sheet(workbook, workbook.add_worksheet())
+            self._write_full_sheet(workbook, workbook.add_worksheet(FULL_DATA_SHEET))
+            workbook.close()
+            with open(path, 'rb') as f:
+                return f.read()
+        finally:
+            os.remove(path)
+
+    def _write_drawn_sheet(self, workbook, worksheet):
+        # Same layout as python-pptx's CategoryWorkbookWriter, which the chart XML's references point at
+        category_format = workbook.add_format({'num_format': self.categories.number_format})
+        formats = [workbook.add_format({'num_format': series.number_format}) for series in self]
+        worksheet.set_column(0, 0, 10)
+        worksheet.write_row(0, 1, [series.name for series in self])
+        columns = [series.values for series in self]
+        for row, category in enumerate(self.categories, start=1):
+            worksheet.write(row, 0, category.label, category_format)
+            for column, (values, number_format) in enumerate(zip(columns, formats), start=1):
+                if values[row - 1] is not None:
+                    worksheet.write_number(row, column, values[row - 1], number_format)
+
+    def _write_full_sheet(self, workbook, worksheet):
+        category_format = workbook.add_format({'num_format': self.categories.number_format})
+        worksheet.set_column(0, 0, 10)
+        worksheet.write_row(0, 1, [name for name, _ in self.full_series])
+        columns = [values for _, values in self.full_series]
+        write, write_number = worksheet.write, worksheet.write_number
+        for row, category in enumerate(self.full_categories, start=1):
+            write(row, 0, category, category_format)
+            for column, values in enumerate(columns, start=1):
+                value = values[row - 1]
+                if value == value:  # missing points (NaN) stay empty cells
+                    write_number(row, column, value)
+
+
+@profiled('add_series_chart', chart=True)
+def add_series_chart(slide, categories, series, left, top, width, height, chart_type=XL_CHART_TYPE.LINE,
+                     max_points=None, method='lttb', number_format='General'):
+    # Adds a chart for long series: categories is a sequence (list, array, NumPy array, CSV column) and
+    # series a list of (name, values). Only the points worth drawing are put in the chart, by default about
+    # one per pixel column of the chart at DISPLAY_DPI; method=None draws every point. The embedded workbook
+    # always holds the full data (see SeriesChartData).
+    if max_points is None:
+        max_points = target_pixels(width, height)[0]
+    if method is None:
+        indices = range(len(categories))
+    else:
+        indices = downsample_indices([values for _, values in series], max_points, method)
+
+    chart_data = SeriesChartData(categories, series, number_format)
+    chart_data.categories = _take(categories, indices)
+    for name, values in series:
+        chart_data.add_series(name, _take_points(values, indices))
+    return slide.shapes.add_chart(chart_type, left, top, width, height, chart_data)
@@ -0,0 +1,129 @@
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pptx
+from pptx.opc.constants import RELATIONSHIP_TYPE as RT
+from pptx.opc.packuri import PackURI
+from pptx.parts.image import ImagePart
+from pptx.parts.slide import SlidePart
+
+from asset_manifest import save_manifests
+import deck_renderer
+from deck_renderer import BLANK_LAYOUT, DeckRenderer
+from image_cache import memo_for
+from incremental_build import SlideCopier
+from pptx_save import save
+import slide_helpers
+
+# POWERPYNT_SHARDS=N makes Main_File render in N worker processes without passing --shards
+SHARDS = int(os.environ.get("POWERPYNT_SHARDS", "0"))
+
+# Shard packages are scratch files read back once, so their XML is deflated at the fastest level
+SHARD_XML_LEVEL = 1
+
+
+def shard_ranges(slide_count, shards):
+    # Splits range(slide_count) into at most `shards` contiguous (start, stop) ranges of near-equal size
+    shards = max(1, min(shards, slide_count))
+    size, extra = divmod(slide_count, shards)
+    ranges = []
+    start = 0
+    for index in range(shards):
+        stop = start + size + (1 if index < extra else 0)
+        ranges.append((start, stop))
+        start = stop
+    return ranges
+
+
+def render_shard(spec, base_dir, start, stop, path, native_transforms=False, compact=False):
+    # Runs in a worker process: renders slides[start:stop] of the spec into a package of their own at path.
+    # Returns (path, seconds).
+    begin = time.perf_counter()
+    slide_helpers.set_native_transforms(native_transforms)
+    renderer = DeckRenderer(spec, base_dir, compact)
+    prs = renderer.new_presentation()
+    for slide_spec in spec['slides'][start:stop]:
+        renderer.render_slide(prs, slide_spec)
+    memo_for(prs).finish()
+    save_manifests()  # pool workers exit without running atexit handlers
+    save(prs, path, xml_compresslevel=SHARD_XML_LEVEL)
+    return path, time.perf_counter() - begin
+
+
+class ShardMerger(SlideCopier):
+    # Appends the slides of shard packages, in order, to one Presentation. Slides, charts, workbooks and
+    # media are renumbered from counters kept here: python-pptx's add_slide and next_partname look through
+    # every slide relationship or part for each new one, which makes merging thousands of slides quadratic.
+    # Every slide is related to the merged deck's own layout, and identical media from different shards
+    # (same SHA-1) share one part.
+
+    def __init__(self, prs):
+        super().__init__(None, prs)
+        self._images = {}  # SHA-1 -> image part in prs
+        self._used_partnames = {str(part.partname) for part in self.package.iter_parts()}
+        self._next_index = {}  # partname prefix -> next number to try
+        self._sldIdLst = prs.slides._sldIdLst
+        self._next_slide_id = max([255] + [int(sldId.get('id')) for sldId in self._sldIdLst]) + 1
+
+    def add_shard(self, shard_prs, layout):
+        # Parts are shared within a shard only; media across shards are matched by hash
+        self.old_prs = shard_prs
+        self._copied = {}
+        return [self.copy_slide(slide, layout) for slide in shard_prs.slides]
+
+    def _add_slide(self, layout):
+        # Like prs.slides.add_slide(layout), without the layout's placeholders, which copy_slide replaces
+        partname = self._next_partname('/ppt/slides/slide%d.xml')
+        slide_part = SlidePart.new(partname, self.package, layout.part)
+        rId = self.prs.part.rels._add_relationship(RT.SLIDE, slide_part)
+        self._sldIdLst._add_sldId(id=self._next_slide_id, rId=rId)
+        self._next_slide_id += 1
+        return slide_part.slide
+
+    def _image_part(self, old_part):
+        part = self._images.get(old_part.sha1)
+        if part is None:
+            partname = self._next_partname(f"/ppt/media/image%d.{old_part.partname.ext}")
+            part = ImagePart(partname, old_part.content_type, self.package, old_part.blob)
+            self._images[old_part.sha1] = part
+        return part
+
+    def _next_partname(self, template):
+        # Numbers are counted per prefix, so image1.png is followed by image2.jpg as python-pptx would name them
+        prefix = template.split('%d')[0]
+        index = self._next_index.get(prefix, 1)
+        while template % index in self._used_partnames:
+            index += 1
+        self._next_index[prefix] = index + 1
+        partname = template % index
+        self._used_partnames.add(partname)
+        return PackURI(partname)
+
+
+def render_sharded(spec, base_dir, shards, workers=None):
+    # Builds the deck like render_deck, with contiguous slide ranges rendered in parallel worker processes
+    # and merged in order as they finish. Returns (prs, timings) where timings has per-shard render
+    # seconds and the merge seconds.
+    renderer = DeckRenderer(spec, base_dir)
+    prs = renderer.new_presentation()
+    layout = prs.slide_layouts[spec.get('layout', BLANK_LAYOUT)]
+    merger = ShardMerger(prs)
+    ranges = shard_ranges(len(spec['slides']), shards)
+    timings = {'shards': [], 'merge': 0.0}
+    with tempfile.TemporaryDirectory(prefix='powerpynt-shards-') as scratch, \
+            ProcessPoolExecutor(max_workers=workers or len(ranges)) as executor:
+        futures = [executor.submit(render_shard, spec, base_dir, start, stop,
+                                   os.path.join(scratch, f"shard{index}.pptx"), slide_helpers.native_transforms,
+                                   deck_renderer.COMPACT_SLIDES)
+                   for index, (start, stop) in enumerate(ranges)]
+        # Merging shard 0 overlaps with the rendering of the later shards
+        for future in futures:
+            path, seconds = future.result()
+            timings['shards'].append(seconds)
+            start = time.perf_counter()
+            merger.add_shard(pptx.Presentation(path), layout)
+            timings['merge'] += time.perf_counter() - start
+            os.remove(path)
+    return prs, timings
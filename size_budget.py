@@ -0,0 +1,193 @@
+import argparse
+import io
+import json
+import os
+import sys
+import time
+
+from PIL import Image
+from pptx.parts.image import ImagePart
+
+from image_cache import memo_for
+from image_pipeline import EMU_PER_INCH, target_pixels
+from media_optimizer import collect_images, retarget
+from pptx_save import XML_COMPRESSLEVEL, ZIP_END_BYTES, package_sizes, save
+
+# Main_File --size-budget: the largest the saved deck may be, in MB (0 for no budget)
+SIZE_BUDGET_MB = float(os.environ.get("POWERPYNT_SIZE_BUDGET_MB", "0"))
+# Images are never taken below this resolution at their largest on-slide size
+MIN_DPI = int(os.environ.get("POWERPYNT_BUDGET_MIN_DPI", "96"))
+
+# Degradation steps, each lossier than the one before: (share of the built pixel size, JPEG quality, PNG
+# palette colors). Each step is encoded from the image as built, never from an earlier step.
+DEGRADE_STEPS = (
+    (1.0, 75, 256),
+    (0.85, 65, 256),
+    (0.7, 55, 128),
+    (0.55, 45, 64),
+    (0.4, 35, 32),
+)
+
+_DEGRADABLE_FORMATS = ('JPEG', 'PNG')  # GIFs may be animated, vector formats have no resolution to lower
+
+
+class _Asset:
+    # One image part of the package: its built size and format, and the step it is degraded to (None while
+    # it is still as built)
+
+    __slots__ = ('part', 'name', 'size', 'format', 'has_alpha', 'display', 'displays', 'unsized', 'built_bytes',
+                 'bytes', 'step', 'next_step', 'pixels', 'blob')
+
+    def __init__(self, part):
+        self.part = part
+        self.name = part.partname.filename
+        self.display = (0, 0)  # filled in by media_optimizer.collect_images, in EMU
+        self.displays = []
+        self.unsized = False
+        blob = part.blob
+        self.built_bytes = self.bytes = len(blob)
+        self.step = None  # the step it ends up at
+        self.next_step = 0
+        self.blob = None
+        try:
+            with Image.open(io.BytesIO(blob)) as image:
+                self.size = self.pixels = image.size
+                self.format = image.format
+                self.has_alpha = image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+        except (OSError, ValueError):  # EMF, WMF, SVG and the like
+            self.size = self.pixels = self.format = self.has_alpha = None
+
+    @property
+    def degradable(self):
+        return self.format in _DEGRADABLE_FORMATS and self.next_step < len(DEGRADE_STEPS)
+
+    def pixels_for(self, scale):
+        # Pixel size at scale, raised to keep MIN_DPI at the image's largest display size in both directions.
+        # Both sides are scaled by the same factor, so the aspect ratio is kept.
+        width, height = self.size
+        if self.display[0] and self.display[1]:
+            floor = target_pixels(*self.display, MIN_DPI)
+            scale = max(scale, min(1.0, max(floor[0] / width, floor[1] / height)))
+        return max(1, round(width * scale)), max(1, round(height * scale))
+
+    def dpi(self):
+        if not self.display[0] or self.pixels is None:
+            return None
+        return self.pixels[0] * EMU_PER_INCH / self.display[0]
+
+    def settings(self):
+        if self.step is None:
+            return 'as built'
+        _, quality, colors = DEGRADE_STEPS[self.step]
+        return f"quality {quality}" if self.format == 'JPEG' else f"{colors} colors"
+
+
+def _encode_step(asset, step):
+    # Returns (bytes, pixel size) of the asset's built image re-encoded at DEGRADE_STEPS[step]
+    scale, quality, colors = DEGRADE_STEPS[step]
+    size = asset.pixels_for(scale)
+    stream = io.BytesIO()
+    with Image.open(io.BytesIO(asset.part.blob)) as image:
+        if image.format == 'JPEG':
+            image.draft(image.mode, size)
+        if image.size != size:
+            image = image.resize(size, Image.LANCZOS)
+        if asset.format == 'JPEG':
+            if image.mode not in ('RGB', 'L'):
+                image = image.convert('RGB')
+            image.save(stream, format='JPEG', quality=quality)
+        else:
+            # Fast octree is the quantizer that keeps alpha, and many times quicker than median cut
+            image = image.convert('RGBA' if asset.has_alpha else 'RGB').quantize(colors, Image.Quantize.FASTOCTREE)
+            image.save(stream, format='PNG')
+    return stream.getvalue(), size
+
+
+def fit_size_budget(prs, budget, xml_compresslevel=XML_COMPRESSLEVEL):
+    # Estimates the size prs will be saved at (see pptx_save.package_sizes) and, while it is over budget
+    # (bytes), tries the next step of DEGRADE_STEPS on the image contributing the most bytes, keeping it when
+    # it makes the image smaller. The images are only replaced in prs once the search is over.
+    # Returns a dict with the estimates before and after and one record per image.
+    start = time.perf_counter()
+    media, relationships = collect_images(prs, _Asset)
+    sources = memo_for(prs).sources()
+    for part, asset in media.items():
+        if part in sources:
+            asset.name = os.path.basename(sources[part])
+    estimate = before = sum(package_sizes(prs, xml_compresslevel).values()) + ZIP_END_BYTES
+
+    candidates = [asset for asset in media.values() if asset.degradable]
+    while estimate > budget and candidates:
+        asset = max(candidates, key=lambda asset: asset.bytes)
+        blob, pixels = _encode_step(asset, asset.next_step)
+        if len(blob) < asset.bytes:
+            estimate += len(blob) - asset.bytes
+            asset.step, asset.blob, asset.bytes, asset.pixels = asset.next_step, blob, len(blob), pixels
+        asset.next_step += 1
+        if not asset.degradable:
+            candidates.remove(asset)
+
+    package = prs.part.package
+    replacement = {}
+    for part, asset in media.items():
+        if asset.blob is not None:
+            replacement[part] = ImagePart(part.partname, part.content_type, package, asset.blob)
+    for source, rel in relationships:
+        if rel.target_part in replacement:
+            retarget(source, rel, replacement[rel.target_part])
+
+    assets = sorted(media.values(), key=lambda asset: -asset.built_bytes)
+    return {
+        'budget': budget, 'estimate_before': before, 'estimate': estimate, 'fits': estimate <= budget,
+        'seconds': time.perf_counter() - start,
+        'assets': [{
+            'asset': asset.name, 'part': asset.part.partname, 'format': asset.format,
+            'built_size': list(asset.size) if asset.size else None,
+            'size': list(asset.pixels) if asset.pixels else None,
+            'dpi': round(asset.dpi()) if asset.dpi() else None,
+            'settings': asset.settings(), 'step': asset.step,
+            'built_bytes': asset.built_bytes, 'bytes': asset.bytes,
+        } for asset in assets],
+    }
+
+
+def report(result):
+    lines = [f"{'asset':28} {'format':>6} {'pixels':>11} {'dpi':>5} {'settings':>12} {'bytes':>10} {'built':>10}"]
+    for record in result['assets']:
+        pixels = 'x'.join(map(str, record['size'])) if record['size'] else '-'
+        lines.append(f"{record['asset'][:28]:28} {record['format'] or '-':>6} {pixels:>11} "
+                     f"{record['dpi'] or '-':>5} {record['settings']:>12} {record['bytes']:>10} "
+                     f"{record['built_bytes']:>10}")
+    verdict = 'fits' if result['fits'] else 'STILL OVER BUDGET'
+    lines.append(f"Estimated package: {result['estimate_before']} -> {result['estimate']} bytes, budget "
+                 f"{result['budget']} ({verdict}, {result['seconds']:.2f}s)")
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    import pptx
+
+    parser = argparse.ArgumentParser(
+        description="Lower the resolution and quality of a deck's largest images until its estimated size "
+                    "fits a budget.")
+    parser.add_argument('pptx', help="deck to fit")
+    parser.add_argument('--budget-mb', type=float, default=SIZE_BUDGET_MB or None, required=not SIZE_BUDGET_MB,
+                        help="the largest the saved deck may be, in MB")
+    parser.add_argument('-o', '--output', help="where the fitted deck is saved (default: only report)")
+    parser.add_argument('--json', help="also write the per-asset settings here")
+    args = parser.parse_args(argv)
+
+    prs = pptx.Presentation(args.pptx)
+    result = fit_size_budget(prs, int(args.budget_mb * 1024 * 1024))
+    print(report(result))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=1)
+    if args.output:
+        written = save(prs, args.output)
+        print(f"Saved {args.output}: {written} bytes")
+    return 0 if result['fits'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,158 @@
+from pptx.oxml.ns import qn
+
+from asset_manifest import asset_info
+from image_cache import ImageCache, memo_for
+from image_pipeline import (DISPLAY_DPI, NATIVE_TRANSFORMS, MemoryBudgetExceeded, cropped_width, fit_box,
+                            image_size, process_image, target_pixels)
+from profiling import profiled
+from run_styler import RunStyler
+
+# Processed images are cached on disk between runs, so a warm build skips Pillow entirely
+image_cache = ImageCache()
+
+# Set with set_prefetcher() to have images processed in worker processes while the slides are built
+prefetcher = None
+
+# Peak-memory budget in bytes while in streaming mode (see set_streaming); None when streaming is off
+memory_budget = None
+
+# Whether brightness and cropping are left to PowerPoint (see set_native_transforms)
+native_transforms = NATIVE_TRANSFORMS
+
+
+def set_image_cache(cache):
+    # Replaces the image cache used by the picture helpers (e.g. with one in a scratch directory)
+    global image_cache
+    image_cache = cache
+
+
+def set_prefetcher(image_prefetcher):
+    # Installs (or, with None, removes) the ImagePrefetcher used by the picture helpers
+    global prefetcher
+    prefetcher = image_prefetcher
+
+
+def set_streaming(budget):
+    # Turns streaming mode on with a peak-memory budget in bytes, or off with None. Images are then processed
+    # one at a time on this thread (the prefetcher is not used), JPEGs are decoded at reduced scale, and the
+    # encoded media is spilled to a temporary directory until the deck is saved. The image cache keeps at
+    # most a quarter of the budget in memory. Images that would not fit the budget decoded are embedded as the
+    # original file instead.
+    global memory_budget
+    memory_budget = budget
+    if budget is not None:
+        image_cache.memory_bytes = min(image_cache.memory_bytes, budget // 4)
+
+
+def set_native_transforms(enabled):
+    # With native transforms on, pictures embed the original file untouched: the image is never decoded or
+    # resampled, brightness becomes a luminance adjustment on the picture and cropping a source rectangle,
+    # both applied by PowerPoint when the slide is drawn. Every use of an image shares one media part.
+    global native_transforms
+    native_transforms = enabled
+
+
+# Colors of the letters G, o, o, g, l, e
+GOOGLE_COLORS = ['4285F4', 'DB4437', 'F4B400', '4285F4', '0F9D58', 'DB4437']  # Blue, Red, Yellow, Blue, Green, Red
+
+google_styler = RunStyler({'Google': GOOGLE_COLORS})
+
+
+# Function to color the word "Google". This was for all the repetitions
+def add_colored_google_text(paragraph, text, font_name, font_size, is_bold, default_color_rgb, use_special_colors=True):
+    # Adds text to a paragraph, finding "Google" case-insensitively, coloring it, ensuring it starts with a capital 'G',
+    # and is never bold.
+    # Other brand keywords can be styled the same way with a RunStyler of their own.
+    google_styler.add_text(paragraph, text, font_name, font_size, is_bold, default_color_rgb, use_special_colors)
+
+
+def _presentation(slide):
+    # The Presentation a slide belongs to, so the helpers work on any deck, not just one global
+    return slide.part.package.presentation_part.presentation
+
+
+def lum_for_brightness(factor):
+    # <a:lum> bright and contrast (in 1/1000 %) that scale every channel by factor, like Pillow's
+    # ImageEnhance.Brightness: PowerPoint stretches around mid-grey by the contrast and then shifts by bright
+    contrast = factor - 1 if factor <= 1 else 1 - 1 / factor
+    bright = max(-1.0, min(1.0, (factor - 1) / 2))
+    return int(round(bright * 100000)), int(round(contrast * 100000))
+
+
+def _add_native_picture(slide, image_path, left, top, width, height, brightness, crop_right):
+    def read_original():
+        with open(image_path, 'rb') as f:
+            return f.read()
+
+    picture = memo_for(_presentation(slide)).add_picture(
+        slide, (image_path, 'original'), read_original, left, top, width, height, spill=memory_budget is not None)
+    if crop_right:
+        picture.crop_right = crop_right
+    if brightness is not None and brightness != 1:
+        bright, contrast = lum_for_brightness(brightness)
+        blip = picture._element.blipFill.blip
+        blip.insert(0, blip.makeelement(qn('a:lum'), {'bright': str(bright), 'contrast': str(contrast)}))
+    return picture
+
+
+def _add_processed_picture(slide, image_path, left, top, width=None, height=None, brightness=None, crop_right=None):
+    # Every picture goes through here: the image is cropped, resampled to its on-slide size at DISPLAY_DPI
+    # and brightness-adjusted once, then cached on disk and shared between slides
+    # Sizes come from the asset manifest, so placing a picture never opens the image itself
+    info = asset_info(image_path)
+    pixel_size = image_size(image_path)
+    if crop_right:
+        pixel_size = (cropped_width(pixel_size[0], crop_right), pixel_size[1])
+    width, height = fit_box(pixel_size, width, height, info.dpi)
+    if native_transforms:
+        return _add_native_picture(slide, image_path, left, top, width, height, brightness, crop_right)
+    size = target_pixels(width, height, DISPLAY_DPI)
+    streaming = memory_budget is not None
+    memo_key = (image_path, brightness, crop_right, size, streaming)
+    if prefetcher is not None and not streaming:
+        return memo_for(_presentation(slide)).add_picture(
+            slide, memo_key, prefetcher.submit(image_path, size, brightness, crop_right),
+            left, top, width, height, defer=True)
+    # Reduced decoding changes the output slightly, so it gets cache entries of its own
+    reduced = {'reduced': True} if streaming else {}
+    try:
+        return memo_for(_presentation(slide)).add_picture(
+            slide, memo_key,
+            lambda: image_cache.get_or_create(
+                image_path,
+                lambda: process_image(image_path, size, brightness, crop_right, memory_budget=memory_budget, **reduced),
+                brightness=brightness, crop=crop_right, size=size, **reduced),
+            left, top, width, height, spill=streaming)
+    except MemoryBudgetExceeded as e:
+        # An image too large to decode within the budget is embedded as it is, with PowerPoint applying the
+        # crop and brightness, as with native transforms; the file is copied without ever being decoded.
+        # The memo's stats count these, for the streaming summary.
+        memo_for(_presentation(slide)).over_budget[image_path] = str(e)
+        return _add_native_picture(slide, image_path, left, top, width, height, brightness, crop_right)
+
+
+@profiled('add_picture', image_arg=1)
+def add_picture(slide, image_path, left, top, width=None, height=None):
+    # Adds a picture, downsampled to the resolution it is displayed at
+    return _add_processed_picture(slide, image_path, left, top, width, height)
+
+
+@profiled('add_background_image_with_brightness', image_arg=1)
+def add_background_image_with_brightness(slide, image_path, brightness_factor=0.9):
+    # Opens an image, adjusts its brightness, and adds it as a background
+    prs = _presentation(slide)
+    try:
+        return _add_processed_picture(slide, image_path, 0, 0, width=prs.slide_width, height=prs.slide_height,
+                                      brightness=brightness_factor)
+    except FileNotFoundError:
+        print(f"Error: Background image not found at {image_path}")
+
+
+@profiled('add_cropped_picture', image_arg=1)
+def add_cropped_picture(slide, image_path, left, top, crop_right_percent=0.4, **kwargs):
+    # Opens an image, crops a percentage from the right side, and adds it to the slide.
+    try:
+        return _add_processed_picture(slide, image_path, left, top, crop_right=crop_right_percent, **kwargs)
+
+    except FileNotFoundError:
+        print(f"Error: Image not found at {image_path}")
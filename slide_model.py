@@ -0,0 +1,282 @@
+import weakref
+
+from lxml import etree
+from pptx.enum.text import MSO_ANCHOR, PP_ALIGN
+from pptx.oxml.ns import qn
+from pptx.shapes.autoshape import AutoShapeType
+from pptx.util import Pt
+
+from run_styler import _escape_ctrl_chars
+
+# Compact stand-ins for the python-pptx text box, shape, text frame, paragraph, run and font objects the
+# deck renderer uses. They hold plain values in __slots__ and touch no XML until write_shape() turns a
+# finished shape into its <p:sp> in one pass, producing the same XML the python-pptx calls would have.
+
+_A_AVLST = qn('a:avLst')
+_A_BODYPR = qn('a:bodyPr')
+_A_BR = qn('a:br')
+_A_DEFRPR = qn('a:defRPr')
+_A_EFFECTREF = qn('a:effectRef')
+_A_EXT = qn('a:ext')
+_A_FILLREF = qn('a:fillRef')
+_A_FONTREF = qn('a:fontRef')
+_A_LATIN = qn('a:latin')
+_A_LN = qn('a:ln')
+_A_LNREF = qn('a:lnRef')
+_A_LSTSTYLE = qn('a:lstStyle')
+_A_NOFILL = qn('a:noFill')
+_A_OFF = qn('a:off')
+_A_P = qn('a:p')
+_A_PPR = qn('a:pPr')
+_A_PRSTGEOM = qn('a:prstGeom')
+_A_R = qn('a:r')
+_A_RPR = qn('a:rPr')
+_A_SCHEMECLR = qn('a:schemeClr')
+_A_SOLIDFILL = qn('a:solidFill')
+_A_SPAUTOFIT = qn('a:spAutoFit')
+_A_SRGBCLR = qn('a:srgbClr')
+_A_T = qn('a:t')
+_A_XFRM = qn('a:xfrm')
+_P_CNVPR = qn('p:cNvPr')
+_P_CNVSPPR = qn('p:cNvSpPr')
+_P_EXTLST = qn('p:extLst')
+_P_NVPR = qn('p:nvPr')
+_P_NVSPPR = qn('p:nvSpPr')
+_P_SP = qn('p:sp')
+_P_SPPR = qn('p:spPr')
+_P_STYLE = qn('p:style')
+_P_TXBODY = qn('p:txBody')
+
+# Marks a line break among a paragraph's runs
+LINE_BREAK = None
+
+# The theme references python-pptx gives every new autoshape
+_SHAPE_STYLE = ((_A_LNREF, '1', 'accent1'), (_A_FILLREF, '3', 'accent1'), (_A_EFFECTREF, '2', 'accent1'),
+                (_A_FONTREF, 'minor', 'lt1'))
+
+_autoshape_types = {}  # MSO_SHAPE -> (name prefix, preset geometry)
+# slide part -> (shape tree length, next shape id) after the last write_shape; python-pptx looks through every
+# id in the slide for each new shape, which only needs doing again once something else added a shape
+_next_ids = weakref.WeakKeyDictionary()
+
+
+class FontRecord:
+    # Character properties, like python-pptx's Font. font.color.rgb works too: color is the record itself.
+
+    __slots__ = ('name', 'size', 'bold', 'rgb')
+
+    def __init__(self, name=None, size=None, bold=None, rgb=None):
+        self.name = name
+        self.size = size
+        self.bold = bold
+        self.rgb = rgb
+
+    @property
+    def color(self):
+        return self
+
+
+class RunRecord:
+    # One run of text; font is only created (and <a:rPr> only written) when the font is asked for
+
+    __slots__ = ('text', '_font')
+
+    def __init__(self, text='', font=None):
+        self.text = text
+        self._font = font
+
+    @property
+    def font(self):
+        if self._font is None:
+            self._font = FontRecord()
+        return self._font
+
+
+class ParagraphRecord:
+    # Alignment, paragraph font (<a:defRPr>) and runs; LINE_BREAK entries in runs stand for <a:br>
+
+    __slots__ = ('alignment', '_font', 'runs')
+
+    def __init__(self, alignment=None):
+        self.alignment = alignment
+        self._font = None
+        self.runs = []
+
+    @property
+    def font(self):
+        if self._font is None:
+            self._font = FontRecord()
+        return self._font
+
+    @property
+    def text(self):
+        return ''.join('\v' if run is LINE_BREAK else run.text for run in self.runs)
+
+    @text.setter
+    def text(self, text):
+        # Same splitting as python-pptx: line feeds and vertical tabs become line breaks, empty runs are dropped
+        self.runs = []
+        for index, run_text in enumerate(text.replace('\v', '\n').split('\n')):
+            if index:
+                self.runs.append(LINE_BREAK)
+            if run_text:
+                self.runs.append(RunRecord(run_text))
+
+    def add_run(self):
+        run = RunRecord(None)
+        self.runs.append(run)
+        return run
+
+    def add_styled_runs(self, runs, font_name, size):
+        # The runs RunStyler.add_text computes, as (text, color hex, bold) tuples
+        size = Pt(size)
+        self.runs.extend(RunRecord(text, FontRecord(font_name, size, bold, color)) for text, color, bold in runs)
+
+    def clear(self):
+        self.runs = []
+        return self
+
+
+class ShapeRecord:
+    # A text box (autoshape_type None) or an autoshape with its text frame; text_frame is the record itself
+
+    __slots__ = ('autoshape_type', 'left', 'top', 'width', 'height', 'fill', 'line', 'word_wrap',
+                 'vertical_anchor', 'paragraphs')
+
+    def __init__(self, left, top, width, height, autoshape_type=None):
+        self.autoshape_type = autoshape_type
+        self.left, self.top, self.width, self.height = int(left), int(top), int(width), int(height)
+        self.fill = None  # RGBColor of a solid fill
+        self.line = True  # False hides the outline
+        if autoshape_type is None:
+            self.word_wrap = False
+            self.vertical_anchor = None
+            self.paragraphs = [ParagraphRecord()]
+        else:
+            self.word_wrap = None
+            self.vertical_anchor = MSO_ANCHOR.MIDDLE
+            self.paragraphs = [ParagraphRecord(PP_ALIGN.CENTER)]
+
+    @property
+    def text_frame(self):
+        return self
+
+    def add_paragraph(self):
+        paragraph = ParagraphRecord()
+        self.paragraphs.append(paragraph)
+        return paragraph
+
+    def clear(self):
+        # Like TextFrame.clear(): only the first paragraph is kept, emptied but with its properties
+        del self.paragraphs[1:]
+        self.paragraphs[0].clear()
+
+
+def _autoshape_type(autoshape_type):
+    found = _autoshape_types.get(autoshape_type)
+    if found is None:
+        shape_type = AutoShapeType(autoshape_type)
+        found = _autoshape_types[autoshape_type] = (shape_type.basename, shape_type.prst)
+    return found
+
+
+def _write_font(parent, tag, font):
+    rPr = etree.SubElement(parent, tag)
+    if font.size is not None:
+        rPr.set('sz', str(font.size.centipoints))
+    if font.bold is not None:
+        rPr.set('b', '1' if font.bold else '0')
+    if font.rgb is not None:
+        etree.SubElement(etree.SubElement(rPr, _A_SOLIDFILL), _A_SRGBCLR).set('val', str(font.rgb))
+    if font.name is not None:
+        etree.SubElement(rPr, _A_LATIN).set('typeface', font.name)
+
+
+def _write_paragraph(txBody, paragraph):
+    p = etree.SubElement(txBody, _A_P)
+    if paragraph.alignment is not None or paragraph._font is not None:
+        pPr = etree.SubElement(p, _A_PPR)
+        if paragraph.alignment is not None:
+            pPr.set('algn', PP_ALIGN.to_xml(paragraph.alignment))
+        if paragraph._font is not None:
+            _write_font(pPr, _A_DEFRPR, paragraph._font)
+    for run in paragraph.runs:
+        if run is LINE_BREAK:
+            etree.SubElement(p, _A_BR)
+            continue
+        r = etree.SubElement(p, _A_R)
+        if run._font is not None:
+            _write_font(r, _A_RPR, run._font)
+        t = etree.SubElement(r, _A_T)
+        if run.text is not None:
+            t.text = _escape_ctrl_chars(run.text)
+
+
+def write_shape(slide, record):
+    # Appends the <p:sp> for a ShapeRecord to the slide's shape tree and returns the python-pptx shape
+    spTree = slide.shapes._spTree
+    length, shape_id = _next_ids.get(slide.part, (None, None))
+    if length != len(spTree):
+        shape_id = spTree.max_shape_id + 1
+    sp = spTree.makeelement(_P_SP, {})
+    extLst = spTree.find(_P_EXTLST)
+    if extLst is None:
+        spTree.append(sp)
+    else:
+        extLst.addprevious(sp)
+
+    nvSpPr = etree.SubElement(sp, _P_NVSPPR)
+    cNvPr = etree.SubElement(nvSpPr, _P_CNVPR)
+    cNvPr.set('id', str(shape_id))
+    if record.autoshape_type is None:
+        cNvPr.set('name', f"TextBox {shape_id - 1}")
+        etree.SubElement(nvSpPr, _P_CNVSPPR).set('txBox', '1')
+        prst = 'rect'
+    else:
+        basename, prst = _autoshape_type(record.autoshape_type)
+        cNvPr.set('name', f"{basename} {shape_id - 1}")
+        etree.SubElement(nvSpPr, _P_CNVSPPR)
+    etree.SubElement(nvSpPr, _P_NVPR)
+
+    spPr = etree.SubElement(sp, _P_SPPR)
+    xfrm = etree.SubElement(spPr, _A_XFRM)
+    off = etree.SubElement(xfrm, _A_OFF)
+    off.set('x', str(record.left))
+    off.set('y', str(record.top))
+    ext = etree.SubElement(xfrm, _A_EXT)
+    ext.set('cx', str(record.width))
+    ext.set('cy', str(record.height))
+    etree.SubElement(etree.SubElement(spPr, _A_PRSTGEOM, prst=prst), _A_AVLST)
+    if record.fill is not None:
+        etree.SubElement(etree.SubElement(spPr, _A_SOLIDFILL), _A_SRGBCLR).set('val', str(record.fill))
+    elif record.autoshape_type is None:
+        etree.SubElement(spPr, _A_NOFILL)
+    if not record.line:
+        etree.SubElement(etree.SubElement(spPr, _A_LN), _A_NOFILL)
+
+    if record.autoshape_type is not None:
+        style = etree.SubElement(sp, _P_STYLE)
+        for tag, idx, color in _SHAPE_STYLE:
+            etree.SubElement(etree.SubElement(style, tag, idx=idx), _A_SCHEMECLR).set('val', color)
+
+    txBody = etree.SubElement(sp, _P_TXBODY)
+    bodyPr = etree.SubElement(txBody, _A_BODYPR)
+    wrap = {True: 'square', False: 'none'}.get(record.word_wrap)
+    if record.autoshape_type is None:
+        # Attribute order follows the python-pptx template and setters: wrap first, then anchor
+        if wrap is not None:
+            bodyPr.set('wrap', wrap)
+        if record.vertical_anchor is not None:
+            bodyPr.set('anchor', MSO_ANCHOR.to_xml(record.vertical_anchor))
+        etree.SubElement(bodyPr, _A_SPAUTOFIT)
+    else:
+        bodyPr.set('rtlCol', '0')
+        if record.vertical_anchor is not None:
+            bodyPr.set('anchor', MSO_ANCHOR.to_xml(record.vertical_anchor))
+        if wrap is not None:
+            bodyPr.set('wrap', wrap)
+    etree.SubElement(txBody, _A_LSTSTYLE)
+    for paragraph in record.paragraphs:
+        _write_paragraph(txBody, paragraph)
+    _next_ids[slide.part] = (len(spTree), shape_id + 1)
+    return slide.shapes._shape_factory(sp)
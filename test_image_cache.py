@@ -0,0 +1,22 @@
+from image_cache import ImageCache
+
+
+def test_memory_hit_keeps_entry_from_eviction(tmp_path):
+    # Room for three 100-byte entries: the one read last must outlive the ones written before it
+    cache = ImageCache(str(tmp_path), max_bytes=300)
+    cache.put('hot', b'h' * 100)
+    cache.put('b', b'b' * 100)
+    cache.put('c', b'c' * 100)
+    assert cache.get('hot') == b'h' * 100
+    cache.put('d', b'd' * 100)
+    assert list(cache._entries) == ['c', 'hot', 'd']
+    assert cache.get('hot') == b'h' * 100
+
+
+def test_memory_hit_refreshes_disk_order_across_runs(tmp_path):
+    cache = ImageCache(str(tmp_path), max_bytes=300)
+    for key in ('hot', 'b', 'c'):
+        cache.put(key, key.encode() * 10)
+    cache.get('hot')
+    # A new process orders entries by file modification time
+    assert list(ImageCache(str(tmp_path), max_bytes=300)._entries)[-1] == 'hot'
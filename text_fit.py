@@ -0,0 +1,365 @@
+import argparse
+import os
+import re
+import sys
+import time
+
+from PIL import ImageFont
+from pptx.oxml.ns import qn
+
+# Directories searched (recursively) for .ttf/.otf files, after any listed in POWERPYNT_FONT_DIRS
+FONT_DIRS = [path for path in os.environ.get("POWERPYNT_FONT_DIRS", "").split(os.pathsep) if path] + [
+    '/usr/share/fonts', '/usr/local/share/fonts', os.path.expanduser('~/.fonts'),
+    os.path.expanduser('~/.local/share/fonts'), '/Library/Fonts', '/System/Library/Fonts',
+    os.path.join(os.environ.get('WINDIR', 'C:\\Windows'), 'Fonts'),
+]
+
+# What PowerPoint uses when a run says nothing: 18pt in the theme font
+DEFAULT_FONT = 'Calibri'
+DEFAULT_SIZE = 18.0
+# Single line spacing is about 1.2 times the font size
+LINE_SPACING = 1.2
+# Text frame insets in EMU when bodyPr does not set them
+DEFAULT_INSETS = {'lIns': 91440, 'rIns': 91440, 'tIns': 45720, 'bIns': 45720}
+
+EMU_PER_POINT = 12700
+
+# Tags, resolved once since this module walks a lot of XML
+_A_BODYPR = qn('a:bodyPr')
+_A_BR = qn('a:br')
+_A_DEFRPR = qn('a:defRPr')
+_A_ENDPARARPR = qn('a:endParaRPr')
+_A_EXT = qn('a:ext')
+_A_FLD = qn('a:fld')
+_A_LATIN = qn('a:latin')
+_A_LSTSTYLE = qn('a:lstStyle')
+_A_P = qn('a:p')
+_A_PPR = qn('a:pPr')
+_A_R = qn('a:r')
+_A_RPR = qn('a:rPr')
+_A_T = qn('a:t')
+_A_XFRM = qn('a:xfrm')
+_P_CNVPR = qn('p:cNvPr')
+_P_NVSPPR = qn('p:nvSpPr')
+_P_SP = qn('p:sp')
+_P_SPPR = qn('p:spPr')
+_P_TXBODY = qn('p:txBody')
+_A_SPAUTOFIT = qn('a:spAutoFit')
+_EXT_PATH = f"{_P_SPPR}/{_A_XFRM}/{_A_EXT}"
+_NAME_PATH = f"{_P_NVSPPR}/{_P_CNVPR}"
+_LEVEL_TAGS = [qn(f'a:lvl{level}pPr') for level in range(1, 10)]
+_TEXT_TAGS = (_A_P, _A_PPR, _A_R, _A_FLD, _A_BR, _A_RPR, _A_T, _A_LATIN, _A_DEFRPR, _A_ENDPARARPR)
+
+# Glyph advances are measured once at this pixel size and scaled linearly to any point size
+_REFERENCE_SIZE = 1000
+
+_font_files = None  # normalized file name -> path
+_fonts = {}  # (typeface, bold) -> _FontMetrics
+
+
+def _normalize(name):
+    return re.sub(r'[^a-z0-9]', '', name.lower())
+
+
+def find_font_file(typeface, bold):
+    # Path of the .ttf/.otf file for a typeface (falling back from bold to regular), or None
+    global _font_files
+    if _font_files is None:
+        _font_files = {}
+        for font_dir in FONT_DIRS:
+            for root, _, files in os.walk(font_dir):
+                for name in files:
+                    if name.lower().endswith(('.ttf', '.otf')):
+                        _font_files.setdefault(_normalize(os.path.splitext(name)[0]), os.path.join(root, name))
+    base = _normalize(typeface)
+    styles = ('bold', 'semibold', '') if bold else ('regular', '', 'book', 'medium')
+    for style in styles:
+        path = _font_files.get(base + style)
+        if path is not None:
+            return path
+    return find_font_file(typeface, False) if bold else None
+
+
+class _FontMetrics:
+    # Advance widths of one typeface, in ems, cached per glyph and per word
+
+    def __init__(self, typeface, bold):
+        path = find_font_file(typeface, bold)
+        self.found = path is not None
+        # Without the real font the measurements are only an estimate from Pillow's built-in font
+        self._font = (ImageFont.truetype(path, _REFERENCE_SIZE) if self.found
+                      else ImageFont.load_default(_REFERENCE_SIZE))
+        self._glyphs = {}
+        self._words = {}
+
+    def glyph(self, char):
+        width = self._glyphs.get(char)
+        if width is None:
+            width = self._glyphs[char] = self._font.getlength(char) / _REFERENCE_SIZE
+        return width
+
+    def word(self, word):
+        width = self._words.get(word)
+        if width is None:
+            glyph = self.glyph
+            width = self._words[word] = sum(glyph(char) for char in word)
+        return width
+
+
+def font_metrics(typeface, bold=False):
+    key = (typeface, bool(bold))
+    metrics = _fonts.get(key)
+    if metrics is None:
+        metrics = _fonts[key] = _FontMetrics(typeface, bold)
+    return metrics
+
+
+def wrap_lines(pieces, width):
+    # Greedy word wrap of one paragraph. pieces is a list of (text, metrics, size in pt); width is in points,
+    # or None for no wrapping. Returns a list of (line height, line width) in points.
+    lines = []
+    line_width = 0.0
+    line_size = 0.0
+    pending_space = 0.0
+    empty = True
+    for text, metrics, size in pieces:
+        space = metrics.glyph(' ') * size
+        for index, word in enumerate(text.split(' ')):
+            if index:
+                pending_space += space
+            if not word:
+                continue
+            word_width = metrics.word(word) * size
+            if not empty and width is not None and line_width + pending_space + word_width > width:
+                lines.append((line_size * LINE_SPACING, line_width))
+                line_width, line_size, empty = 0.0, 0.0, True
+            elif not empty:
+                line_width += pending_space
+            pending_space = 0.0
+            if width is not None and word_width > width:
+                # A word wider than the frame is broken between characters
+                for char in word:
+                    char_width = metrics.glyph(char) * size
+                    if not empty and line_width + char_width > width:
+                        lines.append((line_size * LINE_SPACING, line_width))
+                        line_width, line_size = 0.0, 0.0
+                    line_width += char_width
+                    line_size = max(line_size, size)
+                    empty = False
+                continue
+            line_width += word_width
+            line_size = max(line_size, size)
+            empty = False
+        if empty:
+            line_size = max(line_size, size)
+    lines.append(((line_size or DEFAULT_SIZE) * LINE_SPACING, line_width))
+    return lines
+
+
+class FrameFit:
+    # How a text frame's text lays out, in points, and whether it overflows. Text that wraps can only
+    # overflow at the bottom; with wrapping off, a line longer than the frame is an overflow too, unless the
+    # frame resizes to its text (available_width is then None).
+
+    __slots__ = ('lines', 'text_height', 'available_height', 'text_width', 'available_width')
+
+    def __init__(self, lines, text_height, available_height, text_width, available_width):
+        self.lines = lines
+        self.text_height = text_height
+        self.available_height = available_height
+        self.text_width = text_width
+        self.available_width = available_width
+
+    @property
+    def overflow(self):
+        return (self.text_height > self.available_height + 0.01
+                or self.available_width is not None and self.text_width > self.available_width + 0.01)
+
+
+def _font_attributes(rPr, typeface, size, bold):
+    # Applies the sz and b attributes of an <a:rPr>, <a:defRPr> or <a:endParaRPr> to inherited values
+    sz = rPr.get('sz')
+    b = rPr.get('b')
+    return [typeface, int(sz) / 100 if sz is not None else size, b in ('1', 'true') if b is not None else bold]
+
+
+def _level_defaults(txBody):
+    # [typeface, size, bold] of each paragraph level, from the frame's list style (see text_styles.py)
+    levels = [[DEFAULT_FONT, DEFAULT_SIZE, False]] * len(_LEVEL_TAGS)
+    list_style = txBody.find(_A_LSTSTYLE)
+    if list_style is None or not len(list_style):
+        return levels
+    for level, tag in enumerate(_LEVEL_TAGS):
+        defRPr = list_style.find(f'{tag}/{_A_DEFRPR}')
+        if defRPr is not None:
+            latin = defRPr.find(_A_LATIN)
+            typeface = latin.get('typeface', DEFAULT_FONT) if latin is not None else DEFAULT_FONT
+            levels[level] = _font_attributes(defRPr, typeface, DEFAULT_SIZE, False)
+    return levels
+
+
+def _paragraph_lines(txBody, scale):
+    # Yields the lines of every paragraph as lists of (text, metrics, size); a <a:br> starts a new line.
+    # One tag-filtered pass over the text body, so lxml never builds proxies for fills, colors and the like.
+    levels = _level_defaults(txBody)
+    defaults = list(levels[0])
+    lines = current = end = None
+    for element in txBody.iter(_TEXT_TAGS):
+        tag = element.tag
+        if tag == _A_P:
+            if lines is not None:
+                yield from _finish_paragraph(lines, end or defaults, scale)
+            defaults = list(levels[0])
+            lines = [[]]
+            current = end = None
+        elif lines is None:
+            continue  # list styles come before the first paragraph
+        elif tag == _A_PPR:
+            if element.get('lvl'):
+                defaults = list(levels[int(element.get('lvl'))])
+        elif tag == _A_R or tag == _A_FLD:
+            current = list(defaults) + ['']
+            lines[-1].append(current)
+        elif tag == _A_RPR:
+            current[:3] = _font_attributes(element, *current[:3])
+        elif tag == _A_T:
+            current[3] = element.text or ''
+        elif tag == _A_LATIN:
+            current[0] = element.get('typeface', current[0])
+        elif tag == _A_BR:
+            lines.append([])
+            current = list(defaults) + ['']  # a break may carry run properties of its own
+        elif tag == _A_DEFRPR:
+            defaults = current = _font_attributes(element, *defaults)
+        elif tag == _A_ENDPARARPR:
+            end = current = _font_attributes(element, *defaults)
+    if lines is not None:
+        yield from _finish_paragraph(lines, end or defaults, scale)
+
+
+def _finish_paragraph(lines, end, scale):
+    for line in lines:
+        if line:
+            yield [(text, font_metrics(typeface, bold), size * scale) for typeface, size, bold, text in line]
+        else:
+            # An empty line is as tall as the end-of-paragraph properties say
+            yield [('', font_metrics(end[0], end[2]), end[1] * scale)]
+
+
+def measure_shape(shape_element, scale=1.0):
+    # Lays out the text of a <p:sp> element whose text is scaled by scale. Returns a FrameFit, or None when
+    # the shape has no text frame or size.
+    txBody = shape_element.find(_P_TXBODY)
+    ext = shape_element.find(_EXT_PATH)
+    if txBody is None or ext is None:
+        return None
+    bodyPr = txBody.find(_A_BODYPR)
+    insets = {name: int(bodyPr.get(name, default)) if bodyPr is not None else default
+              for name, default in DEFAULT_INSETS.items()}
+    wraps = bodyPr is None or bodyPr.get('wrap') != 'none'
+    available_width = (int(ext.get('cx')) - insets['lIns'] - insets['rIns']) / EMU_PER_POINT
+    available_height = (int(ext.get('cy')) - insets['tIns'] - insets['bIns']) / EMU_PER_POINT
+    lines = []
+    for pieces in _paragraph_lines(txBody, scale):
+        lines.extend(wrap_lines(pieces, available_width if wraps else None))
+    if not wraps and bodyPr is not None and bodyPr.find(_A_SPAUTOFIT) is not None:
+        available_width = None
+    return FrameFit(len(lines), sum(height for height, _ in lines), available_height,
+                    max(width for _, width in lines), available_width)
+
+
+def shrink_to_fit(shape_element, min_scale=0.5):
+    # Scales every run of an overflowing text frame down by the largest factor (not below min_scale) that
+    # makes it fit, writing explicit sizes on the runs. Returns the factor applied (1.0 when it already fit).
+    fit = measure_shape(shape_element)
+    if fit is None or not fit.overflow:
+        return 1.0
+    low, high = min_scale, 1.0
+    for _ in range(10):
+        middle = (low + high) / 2
+        if measure_shape(shape_element, middle).overflow:
+            high = middle
+        else:
+            low = middle
+    _scale_sizes(shape_element.find(_P_TXBODY), low)
+    return low
+
+
+def _scale_sizes(txBody, scale):
+    levels = _level_defaults(txBody)
+    for p in txBody.iterfind(_A_P):
+        pPr = p.find(_A_PPR)
+        defRPr = pPr.find(_A_DEFRPR) if pPr is not None else None
+        level_size = levels[int(pPr.get('lvl', 0)) if pPr is not None else 0][1] * 100
+        default_size = int(defRPr.get('sz')) if defRPr is not None and defRPr.get('sz') else level_size
+        if defRPr is not None and defRPr.get('sz'):
+            defRPr.set('sz', str(max(100, int(default_size * scale))))
+        for child in p:
+            if child.tag in (_A_R, _A_FLD):
+                rPr = child.find(_A_RPR)
+                if rPr is None:
+                    rPr = child.makeelement(_A_RPR, {})
+                    child.insert(0, rPr)
+                size = int(rPr.get('sz', default_size))
+                rPr.set('sz', str(max(100, int(size * scale))))
+        # Empty paragraphs and lines take their height from the end-of-paragraph properties
+        endParaRPr = p.find(_A_ENDPARARPR)
+        if endParaRPr is None:
+            endParaRPr = p.makeelement(_A_ENDPARARPR, {})
+            p.append(endParaRPr)
+        endParaRPr.set('sz', str(max(100, int(int(endParaRPr.get('sz', default_size)) * scale))))
+
+
+def check_presentation(prs, shrink=False, min_scale=0.5):
+    # Measures every text frame in prs. Returns a list of (slide number, shape name, FrameFit) for the
+    # frames that overflow; with shrink=True those are shrunk (see shrink_to_fit) and measured again.
+    overflowing = []
+    for number, slide in enumerate(prs.slides, start=1):
+        for sp in slide.shapes._spTree.iter(_P_SP):
+            fit = measure_shape(sp)
+            if fit is None or not fit.overflow:
+                continue
+            if shrink:
+                shrink_to_fit(sp, min_scale)
+                fit = measure_shape(sp)
+            overflowing.append((number, sp.find(_NAME_PATH).get('name'), fit))
+    return overflowing
+
+
+def report(overflowing):
+    lines = [] if overflowing else ["All text fits."]
+    for number, name, fit in overflowing:
+        state = 'overflows' if fit.overflow else 'shrunk to fit'
+        available_width = 'auto' if fit.available_width is None else f"{fit.available_width:.1f}"
+        lines.append(f"slide {number:>4} {name:24} {state:14} {fit.lines:>3} lines, "
+                     f"{fit.text_width:.1f} x {fit.text_height:.1f}pt of text in "
+                     f"{available_width} x {fit.available_height:.1f}pt")
+    if any(not metrics.found for metrics in _fonts.values()):
+        missing = sorted({typeface for (typeface, _), metrics in _fonts.items() if not metrics.found})
+        lines.append(f"Fonts not found, measured with a stand-in: {', '.join(missing)} "
+                     f"(add their directory to POWERPYNT_FONT_DIRS)")
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    import pptx
+
+    parser = argparse.ArgumentParser(description="Find text frames whose text does not fit, from font metrics.")
+    parser.add_argument('pptx', help="deck to check")
+    parser.add_argument('--shrink', metavar='OUTPUT', help="shrink overflowing text and save the deck here")
+    parser.add_argument('--min-scale', type=float, default=0.5, help="smallest text scale --shrink may use")
+    args = parser.parse_args(argv)
+
+    prs = pptx.Presentation(args.pptx)
+    start = time.perf_counter()
+    overflowing = check_presentation(prs, shrink=bool(args.shrink), min_scale=args.min_scale)
+    elapsed = time.perf_counter() - start
+    print(report(overflowing))
+    print(f"Checked {len(prs.slides)} slides in {elapsed * 1000:.1f} ms")
+    if args.shrink:
+        prs.save(args.shrink)
+    return 1 if any(fit.overflow for _, _, fit in overflowing) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
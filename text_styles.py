@@ -0,0 +1,271 @@
+import argparse
+import io
+import os
+import sys
+import time
+from collections import Counter
+
+from lxml import etree
+from pptx.oxml.ns import qn
+
+# Main_File --shared-styles: move formatting shared by the runs of a text frame into its list style
+SHARED_STYLES_ENABLED = os.environ.get("POWERPYNT_SHARED_STYLES", "") not in ("", "0")
+
+# Run attributes whose value is known when nothing sets them, so empty paragraphs can be pinned to it
+_ATTRIBUTE_DEFAULTS = {'b': '0', 'i': '0'}
+
+# Children of run properties in schema order; the fills are alternatives and count as one property
+_RPR_CHILDREN = [qn(f'a:{name}') for name in (
+    'ln', 'noFill', 'solidFill', 'gradFill', 'blipFill', 'pattFill', 'grpFill', 'effectLst', 'effectDag',
+    'highlight', 'uLnTx', 'uLn', 'uFillTx', 'uFill', 'latin', 'ea', 'cs', 'sym', 'hlinkClick',
+    'hlinkMouseOver', 'rtl', 'extLst')]
+_RPR_ORDER = {tag: index for index, tag in enumerate(_RPR_CHILDREN)}
+_FILLS = {qn(f'a:{name}') for name in ('noFill', 'solidFill', 'gradFill', 'blipFill', 'pattFill', 'grpFill')}
+
+_A_BODYPR = qn('a:bodyPr')
+_A_BR = qn('a:br')
+_A_DEFRPR = qn('a:defRPr')
+_A_ENDPARARPR = qn('a:endParaRPr')
+_A_EXTLST = qn('a:extLst')
+_A_FLD = qn('a:fld')
+_A_LSTSTYLE = qn('a:lstStyle')
+_A_P = qn('a:p')
+_A_PPR = qn('a:pPr')
+_A_R = qn('a:r')
+_A_RPR = qn('a:rPr')
+_P_DEFAULTTEXTSTYLE = qn('p:defaultTextStyle')
+_P_SP = qn('p:sp')
+_P_TXBODY = qn('p:txBody')
+_LEVEL_TAGS = [qn(f'a:lvl{level}pPr') for level in range(1, 10)]
+_SHAPE_TEXT = f'.//{_P_SP}/{_P_TXBODY}'
+_RUN_TAGS = (_A_R, _A_FLD, _A_BR)
+_FILL_KEY = 'fill'
+
+
+def _properties(rPr):
+    # {property: value} of an <a:rPr>, <a:defRPr> or <a:endParaRPr>: attributes by name, children by tag
+    # (fills under one key), each child's value being its serialized XML
+    if rPr is None:
+        return {}
+    properties = dict(rPr.attrib)
+    for child in rPr:
+        properties[_FILL_KEY if child.tag in _FILLS else child.tag] = etree.tostring(child)
+    return properties
+
+
+def _remove(rPr, key):
+    if key == _FILL_KEY:
+        for child in rPr:
+            if child.tag in _FILLS:
+                rPr.remove(child)
+                return
+    elif key[0] == '{':
+        child = rPr.find(key)
+        if child is not None:
+            rPr.remove(child)
+    else:
+        rPr.attrib.pop(key, None)
+
+
+def _set(rPr, key, value):
+    # Sets a property _properties() returned, keeping the children in schema order
+    if not isinstance(value, bytes):
+        rPr.set(key, value)
+        return
+    _remove(rPr, key)
+    child = etree.fromstring(value)
+    position = _RPR_ORDER.get(child.tag, len(_RPR_CHILDREN))
+    for index, sibling in enumerate(rPr):
+        if _RPR_ORDER.get(sibling.tag, len(_RPR_CHILDREN)) > position:
+            rPr.insert(index, child)
+            return
+    rPr.append(child)
+
+
+def _child(parent, tag, before=()):
+    # Returns parent's <tag> child, creating it in front of the first child whose tag is in before
+    child = parent.find(tag)
+    if child is None:
+        child = parent.makeelement(tag, {})
+        for index, sibling in enumerate(parent):
+            if sibling.tag in before:
+                parent.insert(index, child)
+                break
+        else:
+            parent.append(child)
+    return child
+
+
+class _Paragraph:
+    # The formatting of one paragraph, read once: its defaults (python-pptx's paragraph.font), the properties
+    # of each run and line break, and its end-of-paragraph properties, each as (element, properties)
+
+    __slots__ = ('p', 'defaults', 'runs', 'end')
+
+    def __init__(self, p, pPr):
+        self.p = p
+        defRPr = pPr.find(_A_DEFRPR) if pPr is not None else None
+        self.defaults = (defRPr, _properties(defRPr))
+        self.runs = []
+        self.end = (None, {})
+        for child in p:
+            tag = child.tag
+            if tag in _RUN_TAGS:
+                rPr = child.find(_A_RPR)
+                self.runs.append((rPr, _properties(rPr)))
+            elif tag == _A_ENDPARARPR:
+                self.end = (child, _properties(child))
+
+    def needs_pin(self, key):
+        # Whether an empty paragraph's look depends on an inherited value of key that the list style replaces
+        return not self.runs and key not in self.defaults[1] and key not in self.end[1]
+
+
+class TextStyleSharer:
+    # Moves the run formatting every run of a text frame spells out into the frame's list style
+    # (<a:lstStyle>/<a:lvlNpPr>/<a:defRPr>), once per paragraph level, and drops it from the runs that agree
+    # with it. A run's formatting is its own properties over its paragraph's defaults, and only properties
+    # every run of a level has are shared, so no run changes appearance. Empty paragraphs, which took those
+    # properties from further up (the presentation's default text style), have them written on their
+    # end-of-paragraph properties instead; a property that can't be pinned that way is left on the runs.
+
+    def __init__(self, prs):
+        self._inherited = {}  # level -> properties of the presentation's default text style
+        default_style = prs.part._element.find(_P_DEFAULTTEXTSTYLE)
+        for level, tag in enumerate(_LEVEL_TAGS):
+            lvl = default_style.find(tag) if default_style is not None else None
+            self._inherited[level] = _properties(lvl.find(_A_DEFRPR) if lvl is not None else None)
+        self.frames = 0
+        self.properties = 0
+
+    def share_presentation(self, prs):
+        for slide in prs.slides:
+            for txBody in slide.shapes._spTree.iterfind(_SHAPE_TEXT):
+                self.share_frame(txBody)
+
+    def share_frame(self, txBody):
+        levels = {}  # level -> [_Paragraph, ...]
+        for p in txBody.iterfind(_A_P):
+            pPr = p.find(_A_PPR)
+            level = int(pPr.get('lvl', 0)) if pPr is not None else 0
+            levels.setdefault(level, []).append(_Paragraph(p, pPr))
+        shared_any = False
+        for level, paragraphs in sorted(levels.items()):
+            shared_any |= self._share_level(txBody, level, paragraphs)
+        if shared_any:
+            self.frames += 1
+
+    def _share_level(self, txBody, level, paragraphs):
+        run_properties = []
+        for paragraph in paragraphs:
+            for _, properties in paragraph.runs:
+                if paragraph.defaults[1]:
+                    properties = {**paragraph.defaults[1], **properties}
+                run_properties.append(properties)
+        if len(run_properties) < 2:
+            return False
+        common = set(run_properties[0]).intersection(*run_properties[1:])
+        if not common:
+            return False
+        list_style = txBody.find(_A_LSTSTYLE)
+        lvl = list_style.find(_LEVEL_TAGS[level]) if list_style is not None else None
+        inherited = dict(self._inherited.get(level, {}))
+        inherited.update(_properties(lvl.find(_A_DEFRPR) if lvl is not None else None))
+
+        shared = {}  # property -> (value for the list style, value pinned on empty paragraphs)
+        for key in common:
+            value, count = Counter(properties[key] for properties in run_properties).most_common(1)[0]
+            if count < 2:
+                continue
+            fallback = inherited.get(key, _ATTRIBUTE_DEFAULTS.get(key))
+            if fallback is None and any(paragraph.needs_pin(key) for paragraph in paragraphs):
+                continue
+            shared[key] = (value, fallback)
+        if not shared:
+            return False
+
+        if list_style is None:
+            list_style = txBody.makeelement(_A_LSTSTYLE, {})
+            txBody.find(_A_BODYPR).addnext(list_style)
+        if lvl is None:
+            lvl = _child(list_style, _LEVEL_TAGS[level], before=set(_LEVEL_TAGS[level + 1:]) | {_A_EXTLST})
+        level_defaults = _child(lvl, _A_DEFRPR, before={_A_EXTLST})
+        for key, (value, _) in shared.items():
+            _set(level_defaults, key, value)
+        for paragraph in paragraphs:
+            for key, (_, fallback) in shared.items():
+                if paragraph.needs_pin(key):
+                    _set(_child(paragraph.p, _A_ENDPARARPR), key, fallback)
+            # A paragraph default that differs from the list style keeps overriding it, so its runs must
+            # keep their own value of that property too
+            keys = [(key, value) for key, (value, _) in shared.items()
+                    if paragraph.defaults[1].get(key, value) == value]
+            for rPr, properties in [paragraph.defaults, paragraph.end] + paragraph.runs:
+                if rPr is None:
+                    continue
+                for key, value in keys:
+                    if properties.get(key) == value:
+                        _remove(rPr, key)
+                if not len(rPr) and not rPr.attrib and rPr.tag != _A_ENDPARARPR:
+                    parent = rPr.getparent()
+                    parent.remove(rPr)
+                    if parent.tag == _A_PPR and not len(parent) and not parent.attrib:
+                        paragraph.p.remove(parent)
+        self.properties += len(shared)
+        return True
+
+
+def share_text_styles(prs):
+    # Shares the run formatting of every text frame in prs (see TextStyleSharer). Returns (frames changed,
+    # properties moved into list styles).
+    sharer = TextStyleSharer(prs)
+    sharer.share_presentation(prs)
+    return sharer.frames, sharer.properties
+
+
+def slide_xml_bytes(prs):
+    return sum(len(etree.tostring(slide._element)) for slide in prs.slides)
+
+
+def _timed_save_and_parse(prs):
+    # Seconds to save prs to memory, and to open it again (python-pptx parses every XML part on open)
+    import pptx
+
+    start = time.perf_counter()
+    buffer = io.BytesIO()
+    prs.save(buffer)
+    saved = time.perf_counter()
+    buffer.seek(0)
+    pptx.Presentation(buffer)
+    return saved - start, time.perf_counter() - saved
+
+
+def main(argv=None):
+    import pptx
+
+    parser = argparse.ArgumentParser(description="Move run formatting shared within text frames into list styles.")
+    parser.add_argument('pptx', help="deck to restyle")
+    parser.add_argument('-o', '--output', help="where the restyled deck is saved (default: only report)")
+    args = parser.parse_args(argv)
+
+    prs = pptx.Presentation(args.pptx)
+    before_bytes = slide_xml_bytes(prs)
+    before_save, before_parse = _timed_save_and_parse(prs)
+    start = time.perf_counter()
+    frames, properties = share_text_styles(prs)
+    elapsed = time.perf_counter() - start
+    after_bytes = slide_xml_bytes(prs)
+    after_save, after_parse = _timed_save_and_parse(prs)
+
+    print(f"Shared {properties} properties in {frames} text frames in {elapsed * 1000:.0f} ms")
+    print(f"Slide XML: {before_bytes} -> {after_bytes} bytes "
+          f"({(before_bytes - after_bytes) / max(before_bytes, 1):.1%} smaller)")
+    print(f"Save: {before_save * 1000:.0f} -> {after_save * 1000:.0f} ms, "
+          f"open and parse: {before_parse * 1000:.0f} -> {after_parse * 1000:.0f} ms")
+    if args.output:
+        prs.save(args.output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())